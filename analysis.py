@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+
+"""\
+file running the analysis described in a config file (see analysis.json)
+the config contains the models, the models whose summary is printed, the regressions per group,
+the descriptive tables, the regression tables and the figures,
+every output is stored with a key of its inputs (dataset, specification, code)
+only outputs whose key changed or whose files are missing are built again,
+e.g. editing one covariate list fits one model and renders the tables containing it
+
+usage: python analysis.py [config.json] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import cache
+import descriptives
+import graphs as graph
+import regression as reg
+import tables
+import tools as tool
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# runs the analysis of a config file
+# the state of the outputs is kept in outputs.json and the results of the models in models.parquet
+# (see regression.store_results) of the cache directory
+# input: config file, force = True builds all outputs
+# returns dict {output: 'built' or 'up to date'}
+def run(config_file='analysis.json', force=False):
+    with open(config_file) as file:
+        config = json.load(file)
+    cache_dir = config['data'].get('cache_dir', 'cache')
+    session = {'filename': config['data']['filename'], 'cache_dir': cache_dir, 'models': dict(),
+               'state_file': os.path.join(cache_dir, 'outputs.json'), 'report': dict()}
+    store = os.path.join(cache_dir, 'models.parquet')
+    session['state'] = read_state(session['state_file'])
+    data_key = cache.dataset_key(session['filename'], cache_dir, attrition=True)[1]
+
+    if config['data'].get('attrition'):
+        filename = config['data']['attrition']
+        update(session, filename, [data_key], [filename], force,
+               lambda: dataset(session, 'attrition').to_csv(filename, sep=';', index=False))
+
+    # models, stale models are fitted together on a shared design
+    # the summaries of the models (statsmodels) are kept in the state and printed for the models in summaries
+    models = config.get('models', {})
+    specs = {name: (model['dependent'], model['independent'], model.get('intercept', True))
+             for name, model in models.items()}
+    model_code = code_hash(reg, tables)
+    keys = {name: output_key('model', data_key, specs[name], model_code) for name in models}
+    stored = reg.stored_models(store)
+    stale = [name for name in models if force or name not in stored or
+             session['state']['models'].get(name, {}).get('key') != keys[name] or
+             'summary' not in session['state']['models'][name]]
+    if len(stale) > 0:
+        fitted = reg.regression_family(dataset(session), [specs[name] for name in stale])
+        reg.store_results(fitted, store, stale, data_key)
+        for name, model in zip(stale, fitted):
+            session['models'][name] = model
+            session['state']['models'][name] = {'key': keys[name], 'hash': tables.extract(model)['hash'],
+                                                'summary': str(model.summary())}
+        write_state(session)
+    for name in models:
+        session['report'][name] = 'built' if name in stale else 'up to date'
+        print('{:<12} model {}'.format(session['report'][name], name))
+    hashes = {name: session['state']['models'][name]['hash'] for name in models}
+    for name in config.get('summaries', []):
+        print(session['state']['models'][name]['summary'])
+
+    # variables constant within the groups (e.g. country-level covariates) are left out of the models (drop)
+    for filename, spec in config.get('grouped_regressions', {}).items():
+        family = [(dependent, [var for var in independent if var not in spec.get('drop', [])], intercept)
+                  for dependent, independent, intercept in [specs[name] for name in spec['models']]]
+        by = spec.get('by', 'interview_conducted')
+        update(session, filename, [data_key, family, spec['models'], by, code_hash(reg)], [filename], force,
+               lambda: reg.grouped_regression(
+                   dataset(session), family, by, names=spec['models']).to_csv(filename, sep=';', index=False))
+
+    for filename, spec in config.get('descriptions', {}).items():
+        update(session, filename, [data_key, spec, code_hash(tool, descriptives)], [filename + '.csv'], force,
+               lambda: tool.save_description(
+                   dataset(session), spec['columns'], filename, spec.get('by'), spec.get('weight'),
+                   spec.get('decimals')))
+
+    for filename, spec in config.get('tables', {}).items():
+        formats = spec.get('formats', ['html'])
+        files = [filename + '.' + tables.EXTENSIONS[table_format] for table_format in formats]
+        update(session, filename, [[hashes[name] for name in spec['models']], spec, code_hash(tables)], files, force,
+               lambda: tables.write_table(reg.load_results(store, spec['models']), filename, formats,
+                                          **spec.get('options', {})))
+
+    for filename, spec in config.get('figures', {}).items():
+        formats = spec.get('formats', ['png'])
+        files = [filename + '.' + extension for extension in formats]
+        update(session, filename, [data_key, spec, hashes[spec['model']], code_hash(graph)], files, force,
+               lambda: figure(session, spec, store, filename, formats))
+
+    # outputs and models removed from the config
+    state = session['state']
+    state['models'] = {name: entry for name, entry in state['models'].items() if name in models}
+    state['outputs'] = {name: key for name, key in state['outputs'].items() if name in session['report']}
+    write_state(session)
+    return session['report']
+
+
+# necessary for run
+# builds an output if the key of its inputs changed or one of its files is missing (build is called at once)
+def update(session, name, inputs, files, force, build):
+    key = output_key(name, *inputs)
+    if force or session['state']['outputs'].get(name) != key or not all(os.path.exists(f) for f in files):
+        build()
+        session['state']['outputs'][name] = key
+        write_state(session)
+        session['report'][name] = 'built'
+    else:
+        session['report'][name] = 'up to date'
+    print('{:<12} {}'.format(session['report'][name], name))
+
+
+# necessary for run
+# creates a scatterplot with the regression line of a model (loaded from the store if it was not fitted in this run)
+def figure(session, spec, store, filename, formats):
+    df = dataset(session)
+    model = session['models'].get(spec['model'])
+    if model is None:
+        model = reg.load_results(store, [spec['model']])[0]
+    graph.scatter_fit(df, spec['x'], spec['y'], model=model, filename=filename, formats=formats,
+                      **spec.get('options', {}))
+
+
+# necessary for run
+# prepared dataset (or attrition) of the config, loaded from the cache once and only if an output is built
+def dataset(session, part='df'):
+    if 'df' not in session:
+        session['df'], session['attrition'] = cache.prepare_data(session['filename'], session['cache_dir'],
+                                                                 attrition=True)
+    return session[part]
+
+
+# sha256-hash of the source files of modules
+def code_hash(*modules):
+    sha = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as file:
+            sha.update(file.read())
+    return sha.hexdigest()
+
+
+# key of an output from its inputs (JSON-serializable)
+def output_key(*inputs):
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# reads the state of the outputs
+# returns dict with key, hash of the results and summary per model and key per output
+def read_state(filename):
+    try:
+        with open(filename) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'models': {}, 'outputs': {}}
+
+
+# writes the state of the outputs
+def write_state(session):
+    cache.write_json(session['state'], session['state_file'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='runs the analysis of a config file')
+    parser.add_argument('config', nargs='?', default='analysis.json', help='config file')
+    parser.add_argument('--force', action='store_true', help='build all outputs')
+    args = parser.parse_args()
+
+    run(args.config, args.force)
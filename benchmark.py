@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+"""\
+benchmark of the import of the modules, the data preparation stages, the regression and the creation of tables
+runs on synthetic data (see synthetic.py), the data file of the EVS is not necessary
+
+usage: python benchmark.py [--sizes 10000 100000] [--repeat 3] [--imports] [--output file.json] [--compare old.json]
+"""
+
+import argparse
+import datetime
+import importlib.metadata
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import data_handler as data
+import graphs as graph
+import regression as reg
+import synthetic
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# number of rows of the synthetic datasets
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# stages of the data preparation, every stage is run on the loaded data
+STAGES = {
+    'evs_2017': data.evs_2017,
+    'confounders': data.confounders,
+    'remove_non_democratic': data.remove_non_democratic,
+    'sys_jus': data.sys_jus,
+    'prog_cons_score': data.prog_cons_score,
+    'fulfillment_score': data.fulfillment_score,
+    'sexism': data.sexism,
+    'prepare': data.prepare,
+}
+
+# modules whose import is measured
+IMPORTS = ['data_handler', 'cache', 'descriptives', 'tools', 'tables', 'regression', 'graphs', 'analysis', 'main']
+
+# libraries imported by the functions using them, importing one of the modules must not load them
+DEFERRED = ['matplotlib', 'stargazer', 'statsmodels', 'scipy', 'patsy']
+
+# code measuring the import of a module in a new interpreter (as a new worker process)
+IMPORT_CODE = """
+import json, sys, time, tracemalloc
+if {trace}:
+    tracemalloc.start()
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'peak_memory': tracemalloc.get_traced_memory()[1],
+                  'deferred_loaded': sorted(set(name.split('.')[0] for name in sys.modules) & set({deferred}))}}))
+"""
+
+# model of the benchmark of regression and create_html_table
+MODEL = ('sys_jus', ['fulfillment', 'sexism', 'former_socialist_country', 'age',
+                     'C(social_class, Treatment(reference=\'lower class\'))',
+                     'C(female, Treatment(reference=0))'])
+
+
+# runs a function repeatedly on fresh arguments
+# the time is measured without tracemalloc, the peak memory in a separate run with tracemalloc
+# input: function, function creating the arguments, number of repetitions
+# returns dict with best and mean time in seconds and peak memory in bytes
+def measure(function, arguments, repeat=3):
+    times = list()
+    for i in range(repeat):
+        args = arguments()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    args = arguments()
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_memory': peak}
+
+
+# benchmark of the import of the modules, every import runs in a new interpreter
+# the time is measured without tracemalloc, the peak memory in a separate run with tracemalloc
+# returns list of dicts (stage, rows (0), seconds, mean_seconds, peak_memory, deferred_loaded)
+def run_imports(modules=IMPORTS, repeat=3):
+    results = list()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in modules:
+        runs = list()
+        for i in range(repeat + 1):
+            code = IMPORT_CODE.format(module=module, trace=i == repeat, deferred=DEFERRED)
+            output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                    cwd=directory).stdout
+            runs.append(json.loads(output.splitlines()[-1]))
+        times = [r['seconds'] for r in runs[:repeat]]
+        result = {'stage': 'import_' + module, 'rows': 0, 'seconds': min(times), 'mean_seconds': sum(times) / repeat,
+                  'peak_memory': runs[-1]['peak_memory'], 'deferred_loaded': runs[-1]['deferred_loaded']}
+        print('{:<22} {:>15} {:>10.4f} s {:>10.1f} MB {}'.format(
+            result['stage'], '', result['seconds'], result['peak_memory'] / 2 ** 20,
+            'loads ' + ', '.join(result['deferred_loaded']) if len(result['deferred_loaded']) > 0 else ''))
+        results.append(result)
+    return results
+
+
+# benchmark of all stages at all sizes
+# the synthetic data only contains the EVS 2017, so the number of rows is the number of rows loaded
+# returns list of dicts (stage, rows, seconds, mean_seconds, peak_memory)
+def run(sizes=SIZES, repeat=3, seed=0):
+    results = list()
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            data_file = os.path.join(directory, 'evs_synthetic.dta')
+            synthetic.write(synthetic.generate(rows, waves=[7], seed=seed), data_file)
+            results.append(report('load_data', rows, measure(data.load_data, lambda: (data_file,), repeat)))
+            raw = data.load_data(data_file)
+            for stage, function in STAGES.items():
+                results.append(report(stage, rows, measure(function, lambda: (raw.copy(),), repeat)))
+            df = data.prepare(raw.copy())
+            results.append(report('regression', rows, measure(reg.regression, lambda: (df,) + MODEL, repeat)))
+            models = reg.regression_family(df, [MODEL[:1] + (MODEL[1][:2],), MODEL])
+            filename = os.path.join(directory, 'table.html')
+            results.append(report('create_html_table', rows,
+                                  measure(graph.create_html_table, lambda: (models, filename), repeat)))
+            results.append(report('native_html_table', rows,
+                                  measure(lambda m, f: graph.create_html_table(m, f, renderer='native'),
+                                          lambda: (models, filename), repeat)))
+            store = os.path.join(directory, 'models.parquet')
+            reg.store_results(models, store)
+            results.append(report('stored_html_table', rows,
+                                  measure(lambda f: graph.create_html_table(reg.load_results(f), filename,
+                                                                            renderer='native'),
+                                          lambda: (store,), repeat)))
+    return results
+
+
+# necessary for run
+# prints the result of a stage
+# returns dict of the result
+def report(stage, rows, result):
+    result = {'stage': stage, 'rows': rows, **result}
+    print('{:<22} {:>10} rows {:>10.4f} s {:>10.1f} MB'.format(stage, rows, result['seconds'],
+                                                           result['peak_memory'] / 2 ** 20))
+    return result
+
+
+# saves the results with the environment of the run as JSON
+def save(results, filename):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    run_info = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': commit,
+                'python': sys.version.split()[0],
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'statsmodels': version('statsmodels'),
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpus': os.cpu_count()}
+    directory = os.path.dirname(filename)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, 'w') as file:
+        json.dump({'run': run_info, 'results': results}, file, indent=1)
+
+
+# necessary for save
+# version of an installed package (without importing it)
+def version(package):
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+# prints the change of time and memory compared to an earlier run
+def compare(results, filename):
+    with open(filename) as file:
+        old = {(r['stage'], r['rows']): r for r in json.load(file)['results']}
+    for result in results:
+        before = old.get((result['stage'], result['rows']))
+        if before is not None:
+            print('{:<22} {:>10} rows  time x{:.2f}  memory x{:.2f}'.format(
+                result['stage'], result['rows'], result['seconds'] / before['seconds'],
+                result['peak_memory'] / max(before['peak_memory'], 1)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark of the data preparation and the regression')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of rows')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per stage')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--output', default=os.path.join(
+        'benchmarks', datetime.datetime.now().strftime('%Y%m%d_%H%M%S') + '.json'), help='JSON file of the results')
+    parser.add_argument('--imports', action='store_true', help='only measure the import of the modules')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    args = parser.parse_args()
+
+    results = run_imports(repeat=args.repeat)
+    if not args.imports:
+        results += run(args.sizes, args.repeat, args.seed)
+    save(results, args.output)
+    if args.compare is not None:
+        compare(results, args.compare)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+"""\
+file handling the on-disk cache of the prepared dataset
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_handler as data
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# files defining the preparation of the dataset
+# changing one of them invalidates the cached datasets
+PIPELINE_FILES = [data.__file__, data.COUNTRY_FILE]
+
+
+# sha256-hash of the content of a file
+# the file is read in blocks, so it never has to fit into memory
+def file_hash(filename, block_size=2 ** 20):
+    sha = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        block = file.read(block_size)
+        while block:
+            sha.update(block)
+            block = file.read(block_size)
+    return sha.hexdigest()
+
+
+# hash of the data file
+# hashes are stored with size and modification time of the file in the cache directory
+# a file is only hashed again if one of them changed
+def data_hash(filename, cache_dir='cache'):
+    index = read_index(cache_dir)
+    stat = os.stat(filename)
+    key = os.path.abspath(filename)
+    entry = index['files'].get(key)
+    if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime_ns:
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': file_hash(filename)}
+        index['files'][key] = entry
+        write_index(index, cache_dir)
+    return entry['hash']
+
+
+# hash of the code preparing the dataset
+def pipeline_hash():
+    sha = hashlib.sha256()
+    for filename in PIPELINE_FILES:
+        with open(filename, 'rb') as file:
+            sha.update(file.read())
+    return sha.hexdigest()
+
+
+# reads the index of the cache directory
+# returns dict with the hashes of the data files and the current dataset per call of prepare_data
+def read_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'index.json')) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'files': {}, 'datasets': {}}
+
+
+# writes the index of the cache directory
+def write_index(index, cache_dir):
+    write_json(index, os.path.join(cache_dir, 'index.json'))
+
+
+# writes a JSON file, the file is replaced only after it was written completely
+def write_json(content, filename):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temporary = temporary_name(filename)
+    with open(temporary, 'w') as file:
+        json.dump(content, file, indent=1)
+    os.replace(temporary, filename)
+
+
+# name of the temporary file a file is written to before it is replaced
+# the name contains the process id, so processes writing the same file do not share the temporary file
+def temporary_name(filename):
+    return filename + '.' + str(os.getpid()) + '.tmp'
+
+
+# load the prepared dataset from the cache
+# if the data file or the pipeline changed, the dataset is prepared again and the old one removed
+# input: data file, cache directory, further arguments are passed to data_handler.prepare_data
+# returns DataFrame (DataFrame, DataFrame of the attrition if attrition = True)
+def prepare_data(filename='evs_trend.dta', cache_dir='cache', **kwargs):
+    call, key = dataset_key(filename, cache_dir, **kwargs)
+    paths = dataset_paths(key, cache_dir, kwargs.get('attrition', False))
+    if all(os.path.exists(path) for path in paths):
+        frames = [pd.read_parquet(path) for path in paths]
+        return frames[0] if len(frames) == 1 else tuple(frames)
+
+    result = data.prepare_data(filename, **kwargs)
+    frames = [result] if len(paths) == 1 else result
+    for frame, path in zip(frames, paths):
+        temporary = temporary_name(path)
+        frame.to_parquet(temporary)
+        os.replace(temporary, path)
+
+    # remove dataset of the same call with outdated data file or pipeline
+    index = read_index(cache_dir)
+    old_key = index['datasets'].get(call)
+    if old_key is not None and old_key != key:
+        for path in dataset_paths(old_key, cache_dir, kwargs.get('attrition', False)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    index['datasets'][call] = key
+    write_index(index, cache_dir)
+    return result
+
+
+# key of the dataset prepared by a call of prepare_data
+# the key changes with the data file and the pipeline, the data is not loaded
+# returns tuple (call as JSON, key)
+def dataset_key(filename='evs_trend.dta', cache_dir='cache', **kwargs):
+    call = json.dumps([os.path.abspath(filename), sorted(kwargs.items())], default=str)
+    return call, hashlib.sha256((call + data_hash(filename, cache_dir) + pipeline_hash()).encode()).hexdigest()
+
+
+# files of a cached dataset (prepared data, attrition)
+def dataset_paths(key, cache_dir, attrition=False):
+    paths = [os.path.join(cache_dir, key + '.parquet')]
+    if attrition:
+        paths.append(os.path.join(cache_dir, key + '.attrition.parquet'))
+    return paths
+
+
+# incremental preparation of the dataset per partition (country x wave)
+# every variable only depends on the row of the participant, so partitions can be prepared separately
+# partitions are hashed by their rows (independent of the order), only new or changed partitions are prepared
+# the partitions are stored in store_dir (manifest.json with the hashes, one Parquet file per partition)
+# input: data file (e.g. a new release), directory of the stored dataset, variables (all if None), compact dtypes,
+#   remove_missing = True removes stored partitions not contained in the data file,
+#   list of waves (s002vs, waves other than EVS 2017 use the sample of data.prepare_waves)
+# returns DataFrame of all stored partitions
+def prepare_incremental(filename='evs_trend.dta', store_dir='prepared', variables=None, compact=False,
+                        remove_missing=False, waves=(7,)):
+    waves = list(waves)
+    raw = data.load_data(filename, waves)
+    sample = data.SAMPLE if waves == [7] else data.WAVE_SAMPLE
+    setup = hashlib.sha256((pipeline_hash() + json.dumps([variables, compact, waves])).encode()).hexdigest()
+    manifest = read_manifest(store_dir)
+    if manifest['pipeline'] != setup:
+        # preparation changed, all partitions are prepared again
+        for name in list(manifest['partitions']):
+            remove_partition(manifest, name, store_dir)
+        manifest['pipeline'] = setup
+
+    row_hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    positions = {partition_name(country, wave): rows
+                 for (country, wave), rows in raw.groupby(['S009', 's002vs']).indices.items()}
+    hashes = {name: hashlib.sha256(np.sort(row_hashes[rows]).tobytes()).hexdigest()
+              for name, rows in positions.items()}
+    changed = [name for name in positions if manifest['partitions'].get(name, {}).get('hash') != hashes[name]]
+    if remove_missing:
+        for name in [name for name in manifest['partitions'] if name not in positions]:
+            remove_partition(manifest, name, store_dir)
+
+    if len(changed) > 0:
+        # changed partitions are prepared together and split afterwards
+        rows = np.sort(np.concatenate([positions[name] for name in changed]))
+        partitions = pd.Series(np.empty(len(raw), dtype=object), index=raw.index)
+        for name in changed:
+            partitions.iloc[positions[name]] = name
+        prepared = data.prepare(raw.iloc[rows].copy(), variables, compact=compact, sample=sample)
+        groups = prepared.groupby(partitions.loc[prepared.index].to_numpy()).indices
+        for name in changed:
+            remove_partition(manifest, name, store_dir)
+            part = prepared.iloc[groups.get(name, [])]
+            # index of a participant: row within the partition of the data file
+            part.index = np.searchsorted(positions[name], raw.index.get_indexer(part.index))
+            if len(part) > 0:
+                path = os.path.join(store_dir, 'partitions', name + '.parquet')
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temporary = temporary_name(path)
+                part.to_parquet(temporary)
+                os.replace(temporary, path)
+            manifest['partitions'][name] = {'hash': hashes[name], 'rows': len(part)}
+        write_json(manifest, os.path.join(store_dir, 'manifest.json'))
+    elif remove_missing:
+        write_json(manifest, os.path.join(store_dir, 'manifest.json'))
+    return read_partitions(manifest, store_dir, compact)
+
+
+# name of the partition of a country and wave (e.g. DE_7)
+def partition_name(country, wave):
+    return str(country) + '_' + str(wave)
+
+
+# reads the manifest of the stored partitions
+# returns dict with the hash of the preparation and hash and rows per partition
+def read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'manifest.json')) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'pipeline': None, 'partitions': {}}
+
+
+# removes a partition from the manifest and its file
+def remove_partition(manifest, name, store_dir):
+    manifest['partitions'].pop(name, None)
+    try:
+        os.remove(os.path.join(store_dir, 'partitions', name + '.parquet'))
+    except FileNotFoundError:
+        pass
+
+
+# merges the stored partitions in the order of their names
+# the index of a participant is (partition, row within the partition of the data file it was prepared from),
+# so the labels are unique even if partitions were prepared from releases with a different order of the rows
+# returns DataFrame
+def read_partitions(manifest, store_dir, compact=False):
+    names = [name for name, entry in sorted(manifest['partitions'].items()) if entry['rows'] > 0]
+    frames = [pd.read_parquet(os.path.join(store_dir, 'partitions', name + '.parquet')) for name in names]
+    if len(frames) == 0:
+        return pd.DataFrame()
+    df = pd.concat(frames, keys=names, names=['partition', 'row'])
+    if compact:
+        # categories differ between the partitions
+        df = data.compact_dtypes(df)
+    return df
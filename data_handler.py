@@ -4,6 +4,12 @@
 file handling the data necessary for the project
 """
 
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
 __author__ = 'Moritz Möckel'
@@ -12,49 +18,414 @@ __status__ = 'finished'
 __date__ = '10.07.2024'
 
 
+# columns of the EVS trend file necessary to create the variables
+SOURCE_COLUMNS = ['s002vs', 'S009', 'X002_02A', 'X001', 'X003', 'X036C',
+                  'B008', 'E035', 'G035', 'G034', 'C039', 'E033', 'C038', 'C001_01',
+                  'D022', 'D026_03', 'D038', 'D061', 'D062', 'A005', 'D060',
+                  'X011', 'X007', 'X007_02', 'X004', 'X028', 'W003', 'E015', 'X025', 'W002E',
+                  'D059', 'D078', 'E233', 'D037', 'S017']
+
+# file containing democratic and former socialist status per country
+COUNTRY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'countries.csv')
+
+# prefix of the columns marking participants to be removed
+EXCLUDE_PREFIX = 'exclude_'
+
+# items of the scores
+SYS_JUS_ITEMS = ['econ_env', 'inc_ineq', 'imp_ancestry', 'respect_inst_laws', 'no_work_lazy', 'left_right',
+                 'duty_work', 'men_right_job']
+PROG_CONS_ITEMS = ['marry_outdated', 'duty_children', 'imp_marry_child', 'child_suffers', 'wom_hom_child',
+                   'imp_work', 'university_important_prog_cons']
+FULFILLMENT_ITEMS = ['children', 'married', 'living_with_partner', 'stable_relationship', 'work', 'work_partner',
+                     'dec_work', 'education', 'edu_spouse']
+SEXISM_ITEMS = ['men_better_leaders', 'men_better_executives', 'dem_same_rights', 'imp_marry_chores']
+
+# steps defining the sample of a wave, always applied by prepare_data and prepare_waves
+# participants from democratic countries aged 18 or older
+WAVE_SAMPLE = ['non_democratic', 'age']
+
+# steps defining the sample of the project, participants of the EVS 2017
+SAMPLE = ['evs_2017'] + WAVE_SAMPLE
+
+# missing values of the EVS
+# -5 = other missing, -4 = not asked, -3 = not applicable, -2 = no answer, -1 = don't know
+MISSING = [-5, -4, -3, -2, -1]
+
+# source columns of the steps removing missing values not specified in RECODES (see attrition_report)
+EXCLUDE_SOURCES = {'interview_conducted': 'S009', 'birth_country': 'X002_02A'}
+
+# scores stored as float32 by compact (relative rounding error below 1e-7)
+FLOAT32_COLUMNS = ['sys_jus', 'prog_cons_score', 'fulfillment_score', 'fulfillment', 'sexism']
+
+# specification of the variables created from a single column of the data file
+# source: column of the data file
+# missing: values of the source column removing the participant
+# values: recoding of values {old value: new value}, values not listed are kept
+RECODES = {
+    # environment = 0, economy = 9, other (3) removed
+    'econ_env': {'source': 'B008', 'missing': MISSING + [3], 'values': {1: 0, 2: 9}},
+    # all values -1
+    'inc_ineq': {'source': 'E035', 'missing': MISSING, 'values': {i: i - 1 for i in range(1, 11)}},
+    # 0 = not important at all, 3 = not important, 6 = quite important, 9 = very important
+    'imp_ancestry': {'source': 'G035', 'missing': MISSING, 'values': {4: 0, 2: 6, 1: 9}},
+    'respect_inst_laws': {'source': 'G034', 'missing': MISSING, 'values': {4: 0, 2: 6, 1: 9}},
+    # 0 = strongly disagree, 2.25 = disagree, 4.5 = neither agree nor disagree, 6.75 = agree, 9 = strongly agree
+    'duty_work': {'source': 'C039', 'missing': MISSING, 'values': {5: 0, 4: 2.25, 3: 4.5, 2: 6.75, 1: 9}},
+    'no_work_lazy': {'source': 'C038', 'missing': MISSING, 'values': {5: 0, 4: 2.25, 3: 4.5, 2: 6.75, 1: 9}},
+    'men_right_job': {'source': 'C001_01', 'missing': MISSING, 'values': {5: 0, 4: 2.25, 3: 4.5, 2: 6.75, 1: 9}},
+    # upper class: higher controllers (1), self-employed with employees (5), self-employed farmer (11)
+    # middle class: lower controllers (2), routine non manual (3), lower sales-service (4),
+    #   self employed with no employees (6), manual supervisors (7), skilled worker (8)
+    # lower class: unemployed (-3), unskilled worker (9), farm labor (10)
+    'social_class': {'source': 'X036C', 'missing': [-5, -4, -2, -1],
+                     'values': {1: 'upper class', 5: 'upper class', 11: 'upper class',
+                                2: 'middle class', 3: 'middle class', 4: 'middle class',
+                                6: 'middle class', 7: 'middle class', 8: 'middle class',
+                                -3: 'lower class', 9: 'lower class', 10: 'lower class'}},
+    # 0 = left, 9 = right
+    'left_right': {'source': 'E033', 'missing': MISSING, 'values': {i: i - 1 for i in range(1, 11)}},
+    'age': {'source': 'X003', 'missing': MISSING},
+    # 0 = male, 1 = female
+    'female': {'source': 'X001', 'missing': MISSING, 'values': {1: 0, 2: 1}},
+    # -1 = strongly disagree, -0.5 = disagree, 0.5 = agree, 1 = strongly agree
+    'wom_hom_child': {'source': 'D062', 'missing': MISSING, 'values': {4: -1, 3: -0.5, 2: 0.5}},
+    'child_suffers': {'source': 'D061', 'missing': MISSING, 'values': {4: -1, 3: -0.5, 2: 0.5}},
+    'university_important_prog_cons': {'source': 'D060', 'missing': MISSING, 'values': {4: 0, 3: -0.5, 2: 0.5}},
+    # -1 = strongly disagree, -0.5 = disagree, 0 = agree nor disagree, 0.5 = agree, 1 = strongly agree
+    'duty_children': {'source': 'D026_03', 'missing': MISSING, 'values': {5: -1, 4: -0.5, 3: 0, 2: 0.5}},
+    # agree = -1, don't know = 0, disagree = 1 (don't know is kept)
+    'marry_outdated': {'source': 'D022', 'missing': [-5, -4, -3, -2], 'values': {1: -1, 0: 1, -1: 0}},
+    # not very important = -1, rather important = 0, very important = 1
+    'imp_marry_child': {'source': 'D038', 'missing': MISSING, 'values': {2: 0, 3: -1}},
+    # not at all important = -1, not very important = -0.5, rather important = 0.5, very important = 1
+    'imp_work': {'source': 'A005', 'missing': MISSING, 'values': {4: -1, 3: -0.5, 2: 0.5}},
+    # good thing = -1, don't mind = 0, bad thing = 1
+    'dec_work': {'source': 'E015', 'missing': MISSING, 'values': {1: -1, 2: 0, 3: 1}},
+    'children': {'source': 'X011', 'missing': MISSING},
+    # 1 = full time & self-employed, 2 = part-time, 3 = unemployed, 4 = housewife,
+    # 5 = others (retired, student, etc.)
+    'work': {'source': 'X028', 'missing': MISSING, 'values': {3: 1, 7: 3, 5: 4, 4: 5, 6: 5, 8: 5}},
+    # self-employed = 1, military service = 1, unemployed = 3, housewife = 4,
+    # others (retired, student, disabled, etc.) = 5
+    'work_partner': {'source': 'W003', 'missing': MISSING,
+                     'values': {3: 1, 4: 1, 8: 3, 6: 4, 7: 5, 9: 5, 10: 5}},
+    # living together as married = 1, divorced = 2, separated = 2, widowed = 2, single/never married = 3
+    'married': {'source': 'X007', 'missing': MISSING, 'values': {2: 1, 3: 2, 4: 2, 5: 2, 6: 3}},
+    # not applicable (-3) is kept
+    'living_with_partner': {'source': 'X007_02', 'missing': [-5, -4, -2, -1]},
+    'stable_relationship': {'source': 'X004', 'missing': [-5, -4, -2, -1]},
+    'education': {'source': 'X025', 'missing': MISSING},
+    'edu_spouse': {'source': 'W002E', 'missing': [-5, -4, -2, -1]},
+    # 0 = strongly disagree, 3 = disagree, 6 = agree, 9 = strongly agree
+    'men_better_leaders': {'source': 'D059', 'missing': MISSING, 'values': {4: 0, 2: 6, 1: 9}},
+    'men_better_executives': {'source': 'D078', 'missing': MISSING, 'values': {4: 0, 2: 6, 1: 9}},
+    # 0 = an essential characteristic of democracy, 9 = it's against democracy
+    'dem_same_rights': {'source': 'E233', 'missing': MISSING, 'values': {0: 0, **{i: i - 1 for i in range(1, 11)}}},
+    # 0 = very important, 4.5 = rather important, 9 = not very important
+    'imp_marry_chores': {'source': 'D037', 'missing': MISSING, 'values': {1: 0, 2: 4.5, 3: 9}},
+}
+
+
+# loaded data and created variables per data file during this session
+# {(data file, size, modification time, waves): {'data': DataFrame, variable: DataFrame of the columns created}}
+memo = dict()
+
+
 # load data in dataframe and prepare it
+# only the variables passed and the variables they depend on are created (all variables if None)
+# loaded data and created variables are kept in memo and reused by later calls
 # data file must be located in same directory as this file
+# attrition = True additionally returns the attrition of the sample (see attrition_report)
+# compact = True returns the DataFrame with compact dtypes and without source columns (see compact)
+# waves other than the EVS 2017 (s002vs = 7) are loaded into memory, for the full trend file use prepare_waves
+# returns DataFrame (DataFrame, DataFrame of the attrition if attrition = True)
+def prepare_data(filename='evs_trend.dta', variables=None, attrition=False, compact=False, waves=(7,)):
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns, tuple(waves))
+    session = memo.setdefault(key, dict())
+    if 'data' not in session:
+        session['data'] = load_data(filename, waves)
+    sample = SAMPLE if tuple(waves) == (7,) else WAVE_SAMPLE
+    return prepare(session['data'].copy(deep=False), variables, session, attrition, compact, sample)
+
+
+# create the variables passed and the sample steps on loaded data
+# variables are created for all participants, participants marked for removal are removed at the end
+# input: DataFrame, list of variables (all variables if None), optional dict reusing created variables,
+#   attrition = True additionally returns the attrition of the sample, compact = True compacts the dtypes,
+#   steps defining the sample
+# returns DataFrame (DataFrame, DataFrame of the attrition if attrition = True)
+def prepare(df, variables=None, computed=None, attrition=False, compact=False, sample=SAMPLE):
+    if variables is None:
+        variables = [var for var in VARIABLES if var not in SAMPLE]
+    df = build(df, list(sample) + list(variables), computed)
+    prepared = drop_excluded(df)
+    if compact:
+        prepared = compact_dtypes(prepared)
+    if attrition:
+        return prepared, attrition_report(df)
+    return prepared
+
+
+# create variables including the variables they depend on (see VARIABLES)
+# variables already contained in the DataFrame are not created again
+# input: DataFrame, list of variables, optional dict to reuse and store the columns created per variable
+# returns DataFrame including the variables
+def build(df, variables, computed=None):
+    order = list()
+    for var in variables:
+        dependencies(var, order)
+    for var in order:
+        if var in df or EXCLUDE_PREFIX + var in df:
+            continue
+        if computed is not None and var in computed:
+            for col in computed[var]:
+                df[col] = computed[var][col].values
+            continue
+        columns = set(df.columns)
+        df = VARIABLES[var][0](df)
+        if computed is not None:
+            computed[var] = df[[col for col in df.columns if col not in columns]]
+    return df
+
+
+# adds the variable after all variables it depends on to order
+# necessary for build
+def dependencies(var, order):
+    if var not in VARIABLES:
+        raise ValueError('unknown variable: ' + str(var))
+    for dependency in VARIABLES[var][1]:
+        dependencies(dependency, order)
+    if var not in order:
+        order.append(var)
+
+
+# remove created variables kept in memo
+def clear_memo():
+    memo.clear()
+
+
+# prepares the waves of the trend file out-of-core
+# the Stata file is read once in chunks, the rows are written to temporary Parquet files per wave
+# (Parquet files are read per wave directly), the waves are prepared in parallel worker processes
+# memory is bounded by the largest wave per worker, not by the whole file
+# the prepared waves are written to output_dir/wave=<wave>/data.parquet, pd.read_parquet(output_dir) reads
+# all waves with the column wave
+# input: data file (.dta or .parquet), list of waves (s002vs), output directory, variables (all if None),
+#   compact dtypes, number of worker processes (None = all cores, 1 = no pool), rows per chunk
+# returns DataFrame with loaded and prepared rows and file per wave (None if no rows are left)
+def prepare_waves(filename='evs_trend.dta', waves=(1, 2, 4, 5, 7), output_dir='prepared_waves', variables=None,
+                  compact=False, workers=None, chunksize=50000):
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir) as spill_dir:
+        if filename.endswith('.parquet'):
+            sources = [filename] * len(waves)
+        else:
+            sources = spill_waves(filename, waves, spill_dir, chunksize)
+        n = len(waves)
+        arguments = (sources, waves, [output_dir] * n, [variables] * n, [compact] * n)
+        if workers == 1:
+            results = list(map(prepare_wave, *arguments))
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                results = list(executor.map(prepare_wave, *arguments))
+    return pd.DataFrame(results, columns=['wave', 'rows_loaded', 'rows', 'file'])
+
+
+# necessary for prepare_waves
+# writes the rows of every wave to Parquet files in spill_dir/<wave>, one file per chunk
+# returns list of the directories of the waves
+def spill_waves(filename, waves, spill_dir, chunksize=50000):
+    directories = [os.path.join(spill_dir, str(wave)) for wave in waves]
+    for directory in directories:
+        os.makedirs(directory)
+    with pd.read_stata(filename, columns=SOURCE_COLUMNS, convert_categoricals=False,
+                       chunksize=chunksize) as reader:
+        for i, chunk in enumerate(reader):
+            for wave, directory in zip(waves, directories):
+                part = chunk[chunk.s002vs.to_numpy() == wave]
+                if len(part) > 0:
+                    part.to_parquet(os.path.join(directory, str(i) + '.parquet'))
+    return directories
+
+
+# necessary for prepare_waves
+# prepares one wave from a Parquet file or a directory of Parquet files
+# returns tuple (wave, rows loaded, rows prepared, file)
+def prepare_wave(source, wave, output_dir, variables=None, compact=False):
+    directory = os.path.join(output_dir, 'wave=' + str(wave))
+    shutil.rmtree(directory, ignore_errors=True)
+    if os.path.isdir(source):
+        files = sorted(os.listdir(source), key=lambda name: int(name.split('.')[0]))
+        # no chunk contained the wave
+        if len(files) == 0:
+            return wave, 0, 0, None
+        df = pd.concat([pd.read_parquet(os.path.join(source, name)) for name in files])
+    else:
+        df = load_data(source, [wave])
+    rows_loaded = len(df)
+    df = prepare(df, variables, compact=compact, sample=WAVE_SAMPLE)
+    if len(df) == 0:
+        return wave, rows_loaded, 0, None
+    os.makedirs(directory)
+    filename = os.path.join(directory, 'data.parquet')
+    df.to_parquet(filename)
+    return wave, rows_loaded, len(df), filename
+
+
+# load the columns necessary for the project from the data file (Stata or Parquet)
+# the Stata file is read in chunks and rows not belonging to the waves passed are dropped per chunk,
+# from the Parquet file only the rows of the waves are read
+# input: file name, list of waves (s002vs, EVS 2017 = 7), number of rows per chunk
 # returns DataFrame
-def prepare_data():
-    df = pd.read_stata('evs_trend.dta', convert_categoricals=False)
-    df = evs_2017(df)
-    df = confounders(df)
-    df = remove_non_democratic(df)
-    df = sys_jus(df)
-    df = prog_cons_score(df)
-    df = fulfillment_score(df)
-    df = fulfillment(df)
-    df = sexism(df)
-    return df
+def load_data(filename='evs_trend.dta', waves=(7,), chunksize=50000):
+    if filename.endswith('.parquet'):
+        return pd.read_parquet(filename, columns=SOURCE_COLUMNS, filters=[('s002vs', 'in', list(waves))])
+    chunk_list = list()
+    with pd.read_stata(filename, columns=SOURCE_COLUMNS, convert_categoricals=False,
+                       chunksize=chunksize) as reader:
+        for chunk in reader:
+            chunk_list.append(chunk[chunk.s002vs.isin(waves)])
+    return pd.concat(chunk_list)
+
+
+# mark participants to be removed
+# every step gets its own column, all marked participants are removed at once by drop_excluded
+# input: DataFrame, name of the step, boolean array (True = remove)
+# returns DataFrame including the column marking the participants
+def exclude(df, step, condition):
+    column = EXCLUDE_PREFIX + step
+    if column in df:
+        df[column] = df[column].to_numpy() | np.asarray(condition)
+    else:
+        df[column] = np.asarray(condition)
+    return df
+
+
+# remove all participants marked by exclude in a single step
+# returns DataFrame without the marked participants and the marking columns
+def drop_excluded(df):
+    exclude_cols = [col for col in df.columns if col.startswith(EXCLUDE_PREFIX)]
+    keep = ~df[exclude_cols].to_numpy().any(axis=1)
+    return df.loc[keep, [col for col in df.columns if col not in exclude_cols]]
+
+
+# compact dtypes of the prepared data
+# source columns of the data file are dropped, integer codes and dummies are stored in the smallest integer type,
+# items with exact float32 values (e.g. 2.25) and the scores in FLOAT32_COLUMNS as float32,
+# labels (e.g. social_class, interview_conducted) as Categorical
+# returns DataFrame
+def compact_dtypes(df):
+    columns = dict()
+    for col in df.columns:
+        if col in SOURCE_COLUMNS:
+            continue
+        values = df[col]
+        if col in FLOAT32_COLUMNS:
+            values = values.astype(np.float32)
+        elif values.dtype.kind in 'iub':
+            values = pd.to_numeric(values, downcast='integer')
+        elif values.dtype.kind == 'f':
+            if values.notna().all() and (values % 1 == 0).all():
+                values = pd.to_numeric(values, downcast='integer')
+            elif (values.astype(np.float32) == values).all():
+                values = values.astype(np.float32)
+        elif values.dtype == object:
+            values = values.astype('category')
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+# attrition of the sample caused by the steps marking participants for removal
+# steps are counted in the order they were applied, computed from the marking columns by grouped sums
+# every step creates its variable for all loaded rows, rows_in shows how many of them are still in the sample
+# input: DataFrame before drop_excluded
+# returns DataFrame with one row per country (S009, 'all' = all countries) and step:
+#   rows_in / rows_out = rows in the sample before / after the step
+#   marked = rows marked by the step, removed = rows marked by the step and no step before,
+#   only = rows marked by no other step (rows the sample would gain without the step),
+#   missing_<code> = rows marked because of the missing code in the source column of the step
+def attrition_report(df):
+    steps = [col[len(EXCLUDE_PREFIX):] for col in df.columns if col.startswith(EXCLUDE_PREFIX)]
+    marked = df[[EXCLUDE_PREFIX + step for step in steps]].to_numpy(dtype=bool)
+    earlier = np.zeros_like(marked)
+    earlier[:, 1:] = np.logical_or.accumulate(marked, axis=1)[:, :-1]
+    counts = {'rows_in': ~earlier,
+              'marked': marked,
+              'removed': marked & ~earlier,
+              'only': marked & (marked.sum(axis=1) == 1)[:, None]}
+    for code in MISSING:
+        counts['missing_' + str(code)] = np.zeros_like(marked)
+    for j, step in enumerate(steps):
+        source = RECODES[step]['source'] if step in RECODES else EXCLUDE_SOURCES.get(step)
+        if source is not None:
+            values = df[source].to_numpy()
+            for code in MISSING:
+                counts['missing_' + str(code)][:, j] = marked[:, j] & (values == code)
+
+    countries = df['S009'].astype(str).to_numpy()
+    tables = list()
+    for name, array in counts.items():
+        table = pd.DataFrame(array, columns=steps).groupby(countries).sum()
+        table.loc['all'] = table.sum()
+        tables.append(table.stack().rename(name))
+    report = pd.concat(tables, axis=1).rename_axis(['country', 'step']).reset_index()
+    report['rows_out'] = report['rows_in'] - report['removed']
+    report['step'] = pd.Categorical(report['step'], categories=steps)
+    report['country'] = pd.Categorical(report['country'], categories=['all'] + sorted(set(countries)))
+    report = report.sort_values(['country', 'step'], ignore_index=True)
+    return report[['country', 'step', 'rows_in', 'marked', 'removed', 'rows_out', 'only']
+                  + ['missing_' + str(code) for code in MISSING]]
+
+
+# create variables according to RECODES
+# every variable is recoded in a single pass using a lookup table
+# participants with a missing value are marked for removal
+# input: DataFrame, name or list of names of the variables
+# returns DataFrame including the variables
+def recode(df, variables):
+    if isinstance(variables, str):
+        variables = [variables]
+    for var in variables:
+        spec = RECODES[var]
+        values = df[spec['source']].to_numpy()
+        df = exclude(df, var, np.isin(values, spec['missing']))
+        df[var] = recode_values(values, spec.get('values', {}))
+    return df
+
+
+# recode values using a lookup table covering the range of the values
+# input: numpy array, dict {old value: new value}
+# returns numpy array with the recoded values
+def recode_values(values, mapping):
+    if len(mapping) == 0 or len(values) == 0:
+        return values.copy()
+    if values.dtype.kind not in 'iu':
+        series = pd.Series(values)
+        return series.map(mapping).where(series.isin(list(mapping)), series).to_numpy()
+    low = min(values.min(), min(mapping))
+    high = max(values.max(), max(mapping))
+    new_values = np.array(list(mapping.values()))
+    if new_values.dtype.kind in 'iuf':
+        table = np.arange(low, high + 1, dtype=np.promote_types(np.int64, new_values.dtype))
+    else:
+        table = np.arange(low, high + 1).astype(object)
+    for old, new in mapping.items():
+        table[old - low] = new
+    return table[values.astype(np.int64) - low]
 
 
 # preparation of potential confounding variables
 # returns DataFrame including confounders
 def confounders(df):
-    df = social_class(df)
-    df = former_socialist_country(df)
-    df = age(df)
-    df = female(df)
-    return df
+    return build(df, ['social_class', 'former_socialist_country', 'age', 'female'])
 
 
 # remove non-democratic countries
-# returns DataFrame with participants from non-democratic countries removed
+# returns DataFrame with participants from non-democratic countries marked for removal
 def remove_non_democratic(df):
-    df = df[df.interview_conducted != 'AL']
-    df = df[df.interview_conducted != 'AM']
-    df = df[df.S003 != 31]
-    df = df[df.interview_conducted != 'BY']
-    df = df[df.interview_conducted != 'BA']
-    df = df[df.interview_conducted != 'GE']
-    df = df[df.interview_conducted != 'ME']
-    df = df[df.interview_conducted != 'MK']
-    df = df[df.interview_conducted != 'RU']
-    df = df[df.interview_conducted != 'UA']
-    df = df[df.interview_conducted != 'TR']
-    df = df[df.interview_conducted != 'CY-TCC']
-    df = df[df.interview_conducted != 'RS-KM']
-    df = df[df.interview_conducted != 'MD']
+    df = build(df, ['interview_conducted'])
+    df = exclude(df, 'non_democratic', country_values(df, 'democratic', 1) == 0)
     return df
 
 
@@ -63,170 +434,83 @@ def remove_non_democratic(df):
 # 0 = not from former socialist country
 # 1 = from former socialist country
 def former_socialist_country(df):
-    socialist_country_list = ['AL', 'AM', 'BA', 'BG', 'BY', 'CZ', 'EE', 'GE', 'HR', 'HU', 'RS-KM', 'LT', 'LV', 'MD',
-                              'ME', 'MK', 'PL', 'RS', 'RO', 'RU', 'SI', 'SK', 'UA']
+    df = build(df, ['interview_conducted'])
+    # remove missing
+    df = exclude(df, 'birth_country', df.X002_02A.isin(MISSING))
+    # for countries without socialist history check if born in a socialist region (e.g. east germany)
+    socialist = country_values(df, 'former_socialist', 0) == 1
+    socialist_birth = df['X002_02A'].to_numpy() == country_values(df, 'socialist_birth_country', np.nan)
+    df['former_socialist_country'] = (socialist | socialist_birth).astype(np.int64)
+    return df
+
+
+# country the interview was conducted in
+# returns DataFrame including variable interview_conducted
+def interview_conducted(df):
     df['interview_conducted'] = df['S009']
     # remove missing
-    df = df[df.interview_conducted != -5]
-    df = df[df.interview_conducted != -4]
-    df = df[df.interview_conducted != -3]
-    df = df[df.interview_conducted != -2]
-    df = df[df.interview_conducted != -1]
-    df = df[df.X002_02A != -5]
-    df = df[df.X002_02A != -4]
-    df = df[df.X002_02A != -3]
-    df = df[df.X002_02A != -2]
-    df = df[df.X002_02A != -1]
-    val_list = list()
-    for index, row in df.iterrows():
-        if row['interview_conducted'] in socialist_country_list:
-            val_list.append(1)
-        # for germany check if east germany (were born)
-        elif row['interview_conducted'] == 'DE':
-            if row['X002_02A'] == 278:
-                val_list.append(1)
-            else:
-                val_list.append(0)
-        else:
-            val_list.append(0)
-    df['former_socialist_country'] = val_list
+    df = exclude(df, 'interview_conducted', df.interview_conducted.isin(MISSING))
     return df
 
 
-# returns DataFrame which only contains the EVS 2017
+# load the country metadata from COUNTRY_FILE
+# returns DataFrame indexed by country code
+def load_countries(filename=COUNTRY_FILE):
+    return pd.read_csv(filename, sep=';', comment='#', index_col='country', keep_default_na=False, na_values=[''])
+
+
+# value of the country metadata for every participant
+# joined on the codes of interview_conducted as categorical
+# input: DataFrame, column of the country metadata, value for countries not listed
+# returns numpy array
+def country_values(df, column, default):
+    countries = load_countries()
+    codes = pd.Categorical(df['interview_conducted'], categories=countries.index).codes
+    # code -1 (country not listed) selects the default value appended at the end
+    return np.append(countries[column].to_numpy(dtype=float), default)[codes]
+
+
+# returns DataFrame with participants not from the EVS 2017 marked for removal
 def evs_2017(df):
     # only evs 2017
-    df = df[df.s002vs == 7]
+    df = exclude(df, 'evs_2017', df.s002vs != 7)
     return df
 
 
 # position on economy vs. environment for sys_jus
 # returns DataFrame including variable econ_env
 def econ_env(df):
-    # create variable economy vs environment econ_env
-    df['econ_env'] = df['B008']
-    # remove missing for environment vs. economy & other
-    df = df[df.econ_env != -5]
-    df = df[df.econ_env != -4]
-    df = df[df.econ_env != -3]
-    df = df[df.econ_env != -2]
-    df = df[df.econ_env != -1]
-    df = df[df.econ_env != 3]
-    # recode econ_env
-    # Environment = 0
-    # Economy = 9
-    df['econ_env'] = df['econ_env'].replace([1], 0)
-    df['econ_env'] = df['econ_env'].replace([2], 9)
-    return df
+    return recode(df, 'econ_env')
 
 
 # position on income inequality for sys_jus
 # returns Dataframe including variable inc_eneq
 def inc_ineq(df):
-    df['inc_ineq'] = df['E035']
-    # remove missing
-    df = df[df.inc_ineq != -5]
-    df = df[df.inc_ineq != -4]
-    df = df[df.inc_ineq != -3]
-    df = df[df.inc_ineq != -2]
-    df = df[df.inc_ineq != -1]
-    # recode
-    # all values -1
-    df['inc_ineq'] = df['inc_ineq'].replace([1], 0)
-    df['inc_ineq'] = df['inc_ineq'].replace([2], 1)
-    df['inc_ineq'] = df['inc_ineq'].replace([3], 2)
-    df['inc_ineq'] = df['inc_ineq'].replace([4], 3)
-    df['inc_ineq'] = df['inc_ineq'].replace([5], 4)
-    df['inc_ineq'] = df['inc_ineq'].replace([6], 5)
-    df['inc_ineq'] = df['inc_ineq'].replace([7], 6)
-    df['inc_ineq'] = df['inc_ineq'].replace([8], 7)
-    df['inc_ineq'] = df['inc_ineq'].replace([9], 8)
-    df['inc_ineq'] = df['inc_ineq'].replace([10], 9)
-    return df
+    return recode(df, 'inc_ineq')
 
 
 # position on how important it is to have [respondent's] ancestry for sys_jus
 # returns DataFrame including variable imp_ancestry
 def imp_ancestry(df):
-    df['imp_ancestry'] = df['G035']
-    # remove missing
-    df = df[df.imp_ancestry != -5]
-    df = df[df.imp_ancestry != -4]
-    df = df[df.imp_ancestry != -3]
-    df = df[df.imp_ancestry != -2]
-    df = df[df.imp_ancestry != -1]
-    # 0 = not important at all
-    # 3 = not important
-    # 6 = quite important
-    # 9 = very important
-    df['imp_ancestry'] = df['imp_ancestry'].replace([4], 0)
-    df['imp_ancestry'] = df['imp_ancestry'].replace([2], 6)
-    df['imp_ancestry'] = df['imp_ancestry'].replace([1], 9)
-    return df
+    return recode(df, 'imp_ancestry')
 
 
 # position on how important it is to respect [respondent's] country's political institutions and laws for sys_jus
 # returns DataFrame including variable respect_inst_laws
 def respect_inst_laws(df):
-    df['respect_inst_laws'] = df['G034']
-    # remove missing
-    df = df[df.respect_inst_laws != -5]
-    df = df[df.respect_inst_laws != -4]
-    df = df[df.respect_inst_laws != -3]
-    df = df[df.respect_inst_laws != -2]
-    df = df[df.respect_inst_laws != -1]
-    # 0 = not important at all
-    # 3 = not important
-    # 6 = quite important
-    # 9 = very important
-    df['respect_inst_laws'] = df['respect_inst_laws'].replace([4], 0)
-    df['respect_inst_laws'] = df['respect_inst_laws'].replace([2], 6)
-    df['respect_inst_laws'] = df['respect_inst_laws'].replace([1], 9)
-    return df
+    return recode(df, 'respect_inst_laws')
 
 
 # position on statement 'work is a duty towards society' for sys_jus
 # returns DataFrame including variable duty_work
 def duty_work(df):
-    df['duty_work'] = df['C039']
-    # remove missing
-    df = df[df.duty_work != -5]
-    df = df[df.duty_work != -4]
-    df = df[df.duty_work != -3]
-    df = df[df.duty_work != -2]
-    df = df[df.duty_work != -1]
-    # recode
-    # 0 = strongly disagree
-    # 2.25 = disagree
-    # 4.5 = neither agree nor disagree
-    # 6.75 = agree
-    # 9 = strongly agree
-    df['duty_work'] = df['duty_work'].replace([5], 0)
-    df['duty_work'] = df['duty_work'].replace([4], 2.25)
-    df['duty_work'] = df['duty_work'].replace([3], 4.5)
-    df['duty_work'] = df['duty_work'].replace([2], 6.75)
-    df['duty_work'] = df['duty_work'].replace([1], 9)
-    return df
+    return recode(df, 'duty_work')
 
 
 # social class variable (possible confounder)
 # returns DataFrame including variable social class
 def social_class(df):
-    df['social_class'] = df['X036C']
-    # remove missing
-    df = df[df.social_class != -5]
-    df = df[df.social_class != -4]
-    df = df[df.social_class != -2]
-    df = df[df.social_class != -1]
-    # recode
-    # upper class: higher controllers (1), self-employed with employees (5), self-employed farmer (11)
-    # middle class: lower controllers (2), routine non manual (3), lower sales-service (4),
-    #   self employed with no employees (6), manual supervisors (7), skilled worker (8)
-    # lower class: unemployed (-3), unskilled worker (9), farm labor (10)
-    df['social_class'] = df['social_class'].replace([1, 5, 11], 'upper class')
-    df['social_class'] = df['social_class'].replace([2, 3, 4, 6, 7, 8], 'middle class')
-    df['social_class'] = df['social_class'].replace([-3, 9, 10], 'lower class')
-    return df
+    return recode(df, 'social_class')
 
 
 # positioning on left right scale for sys_jus
@@ -234,81 +518,26 @@ def social_class(df):
 # 9 = right
 # returns DataFrame including variable left_right
 def left_right(df):
-    df['left_right'] = df['E033']
-    # remove missing
-    df = df[df.left_right != -5]
-    df = df[df.left_right != -4]
-    df = df[df.left_right != -3]
-    df = df[df.left_right != -2]
-    df = df[df.left_right != -1]
-    # recode
-    i = 1
-    while i <= 10:
-        df['left_right'] = df['left_right'].replace([i], i - 1)
-        i = i + 1
-    return df
+    return recode(df, 'left_right')
 
 
 # position on statement 'people who don't work turn lazy' for sys_jus
 # returns DataFrame including variable no_work_lazy
 def no_work_lazy(df):
-    df['no_work_lazy'] = df['C038']
-    # remove missing
-    df = df[df.no_work_lazy != -5]
-    df = df[df.no_work_lazy != -4]
-    df = df[df.no_work_lazy != -3]
-    df = df[df.no_work_lazy != -2]
-    df = df[df.no_work_lazy != -1]
-    # recode
-    # 0 = strongly disagree
-    # 2.25 = disagree
-    # 4.5 = neither agree nor disagree
-    # 6.75 = agree
-    # 9 = strongly agree
-    df['no_work_lazy'] = df['no_work_lazy'].replace([5], 0)
-    df['no_work_lazy'] = df['no_work_lazy'].replace([4], 2.25)
-    df['no_work_lazy'] = df['no_work_lazy'].replace([3], 4.5)
-    df['no_work_lazy'] = df['no_work_lazy'].replace([2], 6.75)
-    df['no_work_lazy'] = df['no_work_lazy'].replace([1], 9)
-    return df
+    return recode(df, 'no_work_lazy')
 
 
 # position on statement 'when jobs are scarce, men have more right to a job than women'
 # returns DataFrame including variable men_right_job
 def men_right_job(df):
-    df['men_right_job'] = df['C001_01']
-    # remove missing
-    df = df[df.men_right_job != -5]
-    df = df[df.men_right_job != -4]
-    df = df[df.men_right_job != -3]
-    df = df[df.men_right_job != -2]
-    df = df[df.men_right_job != -1]
-    # recode
-    # 0 = strongly disagree
-    # 2.25 = disagree
-    # 4.5 = neither agree nor disagree
-    # 6.75 = agree
-    # 9 = strongly agree
-    df['men_right_job'] = df['men_right_job'].replace([5], 0)
-    df['men_right_job'] = df['men_right_job'].replace([4], 2.25)
-    df['men_right_job'] = df['men_right_job'].replace([3], 4.5)
-    df['men_right_job'] = df['men_right_job'].replace([2], 6.75)
-    df['men_right_job'] = df['men_right_job'].replace([1], 9)
-    return df
+    return recode(df, 'men_right_job')
 
 
 # system justification variable
-# calls all functions to create necessary variables
+# creates all necessary variables
 # returns DataFrame including variable sys_jus
 def sys_jus(df):
-    df = econ_env(df)
-    df = inc_ineq(df)
-    df = imp_ancestry(df)
-    df = respect_inst_laws(df)
-    df = no_work_lazy(df)
-    df = left_right(df)
-    df = duty_work(df)
-    df = men_right_job(df)
+    df = build(df, SYS_JUS_ITEMS)
     df['sys_jus'] = (df['econ_env'] +
                      df['inc_ineq'] +
                      df['imp_ancestry'] +
@@ -320,6 +549,11 @@ def sys_jus(df):
     return df
 
 
+# categories of prog_con, ordered from progressive to conservative
+PROG_CON_CATEGORIES = ['very progressive', 'progressive', 'slightly progressive', 'moderate',
+                       'slightly conservative', 'conservative', 'very conservative']
+
+
 # assign progressive/conservative category
 # very progressive (score <= -75)
 # progressive ( -50 <= score < -75)
@@ -330,26 +564,14 @@ def sys_jus(df):
 # very conservative (score >= 75)
 # returns DataFrame including variable prog_con
 def assign_prog_con(df):
-    pc_list = list()
-    for index, row in df.iterrows():
-        if row['prog_cons_score'] <= -0.75:
-            pc_list.append('very progressive')
-        elif -0.50 >= row['prog_cons_score'] > -0.75:
-            pc_list.append('progressive')
-        elif -0.25 >= row['prog_cons_score'] > -0.50:
-            pc_list.append('slightly progressive')
-        elif -0.25 < row['prog_cons_score'] < 0.25:
-            pc_list.append('moderate')
-        elif 0.25 <= row['prog_cons_score'] < 0.50:
-            pc_list.append('slightly conservative')
-        elif 0.50 <= row['prog_cons_score'] < 0.75:
-            pc_list.append('conservative')
-        elif row['prog_cons_score'] >= 0.75:
-            pc_list.append('very conservative')
-        else:
-            print(row['prog_cons_score'])
-            pc_list.append('elel')
-    df['prog_con'] = pc_list
+    df = build(df, ['prog_cons_score'])
+    score = df['prog_cons_score'].to_numpy()
+    # bounds of the progressive categories belong to the more progressive category,
+    # bounds of the conservative categories to the more conservative category
+    codes = (np.searchsorted([-0.75, -0.50, -0.25], score, side='left') +
+             np.searchsorted([0.25, 0.50, 0.75], score, side='right'))
+    codes[np.isnan(score)] = -1
+    df['prog_con'] = pd.Categorical.from_codes(codes, categories=PROG_CON_CATEGORIES, ordered=True)
     return df
 
 
@@ -357,181 +579,68 @@ def assign_prog_con(df):
 # keep only if 18 or older
 # returns DataFrame including variable age
 def age(df):
-    df['age'] = df['X003']
-    # remove missing
-    df = df[df.age != -5]
-    df = df[df.age != -4]
-    df = df[df.age != -3]
-    df = df[df.age != -2]
-    df = df[df.age != -1]
+    df = recode(df, 'age')
     # remove age < 18
-    df = df[df.age >= 18]
+    df = exclude(df, 'minor', df.age < 18)
+    return df
+
+
+# design weight of the respondent (for weighted descriptive statistics)
+# missing weights are set to NaN and ignored by the weighted statistics, no participant is removed
+# returns DataFrame including variable weight
+def weight(df):
+    values = df['S017'].to_numpy(dtype=float)
+    df['weight'] = np.where(np.isin(values, MISSING), np.nan, values)
     return df
 
 
 # position on statement 'women want home and child' for prog_cons_score
 # returns DataFrame including variable wom_hom_child
 def wom_hom_child(df):
-    df['wom_hom_child'] = df['D062']
-    # remove missing
-    df = df[df.wom_hom_child != -5]
-    df = df[df.wom_hom_child != -4]
-    df = df[df.wom_hom_child != -3]
-    df = df[df.wom_hom_child != -2]
-    df = df[df.wom_hom_child != -1]
-    # recode
-    # -1 = strongly disagree
-    # -0.5 = disagree
-    # 0.5 = agree
-    # 1 = strongly agree
-    df['wom_hom_child'] = df['wom_hom_child'].replace([4], -1)
-    df['wom_hom_child'] = df['wom_hom_child'].replace([2], 0.5)
-    df['wom_hom_child'] = df['wom_hom_child'].replace([3], -0.5)
-    return df
+    return recode(df, 'wom_hom_child')
 
 
 # variable depicting respondents gender
 # dummy-coded with female = 1
 # returns DataFrame including variable female
 def female(df):
-    df['female'] = df['X001']
-    # remove missing
-    df = df[df.female != -5]
-    df = df[df.female != -4]
-    df = df[df.female != -3]
-    df = df[df.female != -2]
-    df = df[df.female != -1]
-    # recode
-    # 0 = male
-    # 1 = female
-    df['female'] = df['female'].replace([1], 0)
-    df['female'] = df['female'].replace([2], 1)
-    return df
+    return recode(df, 'female')
 
 
 # position on statement 'pre-school child suffers from working mother' for prog_cons_score
 # returns DataFrame including variable child_suffers
 def child_suffers(df):
-    df['child_suffers'] = df['D061']
-    # remove missing
-    df = df[df.child_suffers != -5]
-    df = df[df.child_suffers != -4]
-    df = df[df.child_suffers != -3]
-    df = df[df.child_suffers != -2]
-    df = df[df.child_suffers != -1]
-    # recode
-    # -1 = strongly disagree
-    # -0.5 = disagree
-    # 0.5 = agree
-    # 1 = strongly agree
-    df['child_suffers'] = df['child_suffers'].replace([4], -1)
-    df['child_suffers'] = df['child_suffers'].replace([3], -0.5)
-    df['child_suffers'] = df['child_suffers'].replace([2], 0.5)
-    return df
+    return recode(df, 'child_suffers')
 
 
 # position on statement 'it is a duty towards society to have children' for prog_cons_score
 # returns DataFrame including variable duty_children
 def duty_children(df):
-    df['duty_children'] = df['D026_03']
-    # remove missing
-    df = df[df.duty_children != -5]
-    df = df[df.duty_children != -4]
-    df = df[df.duty_children != -3]
-    df = df[df.duty_children != -2]
-    df = df[df.duty_children != -1]
-    # recode
-    # -1 = strongly disagree
-    # -0.5 = disagree
-    # 0 = agree nor disagree
-    # 0.5 = agree
-    # 1 = strongly agree
-    df['duty_children'] = df['duty_children'].replace([5], -1)
-    df['duty_children'] = df['duty_children'].replace([4], -0.5)
-    df['duty_children'] = df['duty_children'].replace([3], 0)
-    df['duty_children'] = df['duty_children'].replace([2], 0.5)
-    return df
+    return recode(df, 'duty_children')
 
 
 # position on statement 'marriage is an outdated institution' for prog_cons_score
 # returns DataFrame including variable marry_outdated
 def marry_outdated(df):
-    df['marry_outdated'] = df['D022']
-    # remove missing
-    # keep don't know (-1)
-    df = df[df.marry_outdated != -5]
-    df = df[df.marry_outdated != -4]
-    df = df[df.marry_outdated != -3]
-    df = df[df.marry_outdated != -2]
-    # recode
-    # agree = -1
-    # don't know = 0
-    # disagree = 1
-    df['marry_outdated'] = df['marry_outdated'].replace([1], 10)
-    df['marry_outdated'] = df['marry_outdated'].replace([0], 1)
-    df['marry_outdated'] = df['marry_outdated'].replace([-1], 0)
-    df['marry_outdated'] = df['marry_outdated'].replace([10], -1)
-    return df
+    return recode(df, 'marry_outdated')
 
 
 # importance of children for marriage for prog_cons_score
 # returns DataFrame including variable imp_marry_child
 def imp_marry_child(df):
-    df['imp_marry_child'] = df['D038']
-    # remove missing
-    df = df[df.imp_marry_child != -5]
-    df = df[df.imp_marry_child != -4]
-    df = df[df.imp_marry_child != -3]
-    df = df[df.imp_marry_child != -2]
-    df = df[df.imp_marry_child != -1]
-    # recode
-    # not very important = -1
-    # rather important = 0
-    # very important = 1
-    df['imp_marry_child'] = df['imp_marry_child'].replace([2], 0)
-    df['imp_marry_child'] = df['imp_marry_child'].replace([3], -1)
-    return df
+    return recode(df, 'imp_marry_child')
 
 
 # how important is work in life for prog_cons_score
 # returns DataFrame including variable imp_work
 def imp_work(df):
-    df['imp_work'] = df['A005']
-    # remove missing
-    df = df[df.imp_work != -5]
-    df = df[df.imp_work != -4]
-    df = df[df.imp_work != -3]
-    df = df[df.imp_work != -2]
-    df = df[df.imp_work != -1]
-    # recode
-    # not at all important = -1
-    # not very important = -0.5
-    # rather important = 0.5
-    # very important = 1
-    df['imp_work'] = df['imp_work'].replace([4], -1)
-    df['imp_work'] = df['imp_work'].replace([3], -0.5)
-    df['imp_work'] = df['imp_work'].replace([2], 0.5)
-    return df
+    return recode(df, 'imp_work')
 
 
 # decrease of importance placed on work in life for prog_cons_score
 # returns DataFrame including variable dec_work
 def dec_work(df):
-    df['dec_work'] = df['E015']
-    # remove missing
-    df = df[df.dec_work != -5]
-    df = df[df.dec_work != -4]
-    df = df[df.dec_work != -3]
-    df = df[df.dec_work != -2]
-    df = df[df.dec_work != -1]
-    # recode
-    # good thing = -1
-    # don't mind = 0
-    # bad thing = 1
-    df['dec_work'] = df['dec_work'].replace([1], -1)
-    df['dec_work'] = df['dec_work'].replace([2], 0)
-    df['dec_work'] = df['dec_work'].replace([3], 1)
-    return df
+    return recode(df, 'dec_work')
 
 
 # university is more important for a boy than for a girl for prog_cons_score
@@ -541,22 +650,7 @@ def dec_work(df):
 # 1 = strongly agree
 # returns DataFrame including variable university_important_prog_cons
 def university_important_prog_cons(df):
-    # remove missing
-    df['university_important_prog_cons'] = df['D060']
-    df = df[df.university_important_prog_cons != -5]
-    df = df[df.university_important_prog_cons != -4]
-    df = df[df.university_important_prog_cons != -3]
-    df = df[df.university_important_prog_cons != -2]
-    df = df[df.university_important_prog_cons != -1]
-    # recode
-    # -1 = strongly disagree
-    # -0.5 = disagree
-    # 0.5 = agree
-    # 1 = strongly agree
-    df['university_important_prog_cons'] = df['university_important_prog_cons'].replace([4], 0)
-    df['university_important_prog_cons'] = df['university_important_prog_cons'].replace([2], 0.5)
-    df['university_important_prog_cons'] = df['university_important_prog_cons'].replace([3], -0.5)
-    return df
+    return recode(df, 'university_important_prog_cons')
 
 
 # progressive vs. conservative score
@@ -564,47 +658,23 @@ def university_important_prog_cons(df):
 # values between -1 and 1
 # returns DataFrame including variable prog_cons_score
 def prog_cons_score(df):
-    df = marry_outdated(df)
-    df = duty_children(df)
-    df = imp_marry_child(df)
-    df = child_suffers(df)
-    df = wom_hom_child(df)
-    df = imp_work(df)
-    df = university_important_prog_cons(df)
-    score_list = list()
-    for index, row in df.iterrows():
-        score = 0
-        score = score + row['marry_outdated']
-        score = score + row['duty_children']
-        score = score + row['imp_marry_child']
-        score = score + row['child_suffers']
-        score = score + row['wom_hom_child']
-        score = score + row['university_important_prog_cons']
-        if row['female'] == 1:
-            score = score - row['imp_work']
-            # score = score - row['dec_work']
-        else:
-            score = score + row['imp_work']
-            # score = score + row['dec_work']
-        score = score / 7
-        # print(str(score))
-        score_list.append(score)
-    df['prog_cons_score'] = score_list
-    df = assign_prog_con(df)
+    df = build(df, PROG_CONS_ITEMS + ['female'])
+    # work is more important for conservative men and less important for conservative women
+    imp_work = np.where(df['female'].to_numpy() == 1, -df['imp_work'].to_numpy(), df['imp_work'].to_numpy())
+    df['prog_cons_score'] = (df['marry_outdated'].to_numpy() +
+                             df['duty_children'].to_numpy() +
+                             df['imp_marry_child'].to_numpy() +
+                             df['child_suffers'].to_numpy() +
+                             df['wom_hom_child'].to_numpy() +
+                             df['university_important_prog_cons'].to_numpy() +
+                             imp_work) / 7
     return df
 
 
 # how many children for fulfillment_score
 # returns DataFrame including variable children
 def children(df):
-    df['children'] = df['X011']
-    # remove missing
-    df = df[df.children != -5]
-    df = df[df.children != -4]
-    df = df[df.children != -3]
-    df = df[df.children != -2]
-    df = df[df.children != -1]
-    return df
+    return recode(df, 'children')
 
 
 # employment status for fulfillment_score
@@ -615,29 +685,7 @@ def children(df):
 # 5 = others
 # returns DataFrame including variable work
 def work(df):
-    df['work'] = df['X028']
-    # remove missing
-    df = df[df.work != -5]
-    df = df[df.work != -4]
-    df = df[df.work != -3]
-    df = df[df.work != -2]
-    df = df[df.work != -1]
-    # remove retired, student & other
-    # df = df[df.work != 4]
-    # df = df[df.work != 6]
-    # df = df[df.work != 8]
-    # recode
-    # 1 = full time & self-employed
-    # 2 = part-time
-    # 3 = Unemployed
-    # 4 = housewife
-    # 5 = others (retired, student, etc.)
-    df['work'] = df['work'].replace([3], 1)
-    df['work'] = df['work'].replace([7], 3)
-    df['work'] = df['work'].replace([5], 10)
-    df['work'] = df['work'].replace([4, 6, 8], 5)
-    df['work'] = df['work'].replace([10], 4)
-    return df
+    return recode(df, 'work')
 
 
 # employment status of partner for fulfillment_score
@@ -648,28 +696,7 @@ def work(df):
 # 5 = others
 # returns DataFrame including variable work_partner
 def work_partner(df):
-    df['work_partner'] = df['W003']
-    # remove missing
-    df = df[df.work_partner != -5]
-    df = df[df.work_partner != -4]
-    df = df[df.work_partner != -3]
-    df = df[df.work_partner != -2]
-    df = df[df.work_partner != -1]
-    # remove retired, student, disabled & other
-    # df = df[df.work_partner != 5]
-    # df = df[df.work_partner != 7]
-    # df = df[df.work_partner != 9]
-    # df = df[df.work_partner != 10]
-    # recode
-    # self-employed = 1
-    # military service = 1
-    # unemployed = 3
-    # housewife = 4
-    df['work_partner'] = df['work_partner'].replace([3, 4], 1)
-    df['work_partner'] = df['work_partner'].replace([8], 3)
-    df['work_partner'] = df['work_partner'].replace([6], 4)
-    df['work_partner'] = df['work_partner'].replace([7, 9, 10], 5)
-    return df
+    return recode(df, 'work_partner')
 
 
 # marital status for fulfillment_score
@@ -678,23 +705,7 @@ def work_partner(df):
 # 3 = never married
 # returns DataFrame including variable married
 def married(df):
-    df['married'] = df['X007']
-    # remove missing
-    df = df[df.married != -5]
-    df = df[df.married != -4]
-    df = df[df.married != -3]
-    df = df[df.married != -2]
-    df = df[df.married != -1]
-    # recode
-    # living together as married = 1
-    # divorced = 2
-    # separated = 2
-    # widowed = 2
-    # single/never married = 3
-    df['married'] = df['married'].replace([2], 1)
-    df['married'] = df['married'].replace([3, 4, 5], 2)
-    df['married'] = df['married'].replace([6], 3)
-    return df
+    return recode(df, 'married')
 
 
 # living together with partner for fulfillment_score
@@ -703,14 +714,7 @@ def married(df):
 # 1 = yes
 # returns DataFrame including variable living_with_partner
 def living_with_partner(df):
-    df['living_with_partner'] = df['X007_02']
-    # remove missing
-    df = df[df.living_with_partner != -5]
-    df = df[df.living_with_partner != -4]
-    # df = df[df.living_with_partner != -3]
-    df = df[df.living_with_partner != -2]
-    df = df[df.living_with_partner != -1]
-    return df
+    return recode(df, 'living_with_partner')
 
 
 # living in a stable relationship for fulfillment_score
@@ -719,14 +723,7 @@ def living_with_partner(df):
 # 1 = yes
 # returns DataFrame including variable stable_relationship
 def stable_relationship(df):
-    df['stable_relationship'] = df['X004']
-    # remove missing
-    df = df[df.stable_relationship != -5]
-    df = df[df.stable_relationship != -4]
-    # df = df[df.stable_relationship != -3]
-    df = df[df.stable_relationship != -2]
-    df = df[df.stable_relationship != -1]
-    return df
+    return recode(df, 'stable_relationship')
 
 
 # educational level of respondent for fulfillment_score
@@ -740,14 +737,7 @@ def stable_relationship(df):
 # 8 University with degree/higher education - upper-level tertiary
 # returns DataFrame including variable education
 def education(df):
-    df['education'] = df['X025']
-    # remove missing
-    df = df[df.education != -5]
-    df = df[df.education != -4]
-    df = df[df.education != -3]
-    df = df[df.education != -2]
-    df = df[df.education != -1]
-    return df
+    return recode(df, 'education')
 
 
 # educational level of spouse for fulfillment_score
@@ -761,14 +751,7 @@ def education(df):
 # 8 University with degree/higher education - upper-level tertiary
 # returns DataFrame including variable edu_spouse
 def edu_spouse(df):
-    df['edu_spouse'] = df['W002E']
-    # remove missing
-    df = df[df.edu_spouse != -5]
-    df = df[df.edu_spouse != -4]
-    # df = df[df.stable_relationship != -3]
-    df = df[df.edu_spouse != -2]
-    df = df[df.edu_spouse != -1]
-    return df
+    return recode(df, 'edu_spouse')
 
 
 # score about fulfillment of gender-roles
@@ -776,189 +759,107 @@ def edu_spouse(df):
 # 1 = fulfilling most conservative role
 # returns DataFrame including variable fulfillment_score
 def fulfillment_score(df):
-    df = children(df)
-    df = married(df)
-    df = living_with_partner(df)
-    df = stable_relationship(df)
-    df = work(df)
-    df = work_partner(df)
-    df = dec_work(df)
-    df = education(df)
-    df = edu_spouse(df)
-    score_list = list()
-    score_counter_list = list()
-    for index, row in df.iterrows():
-        score = 0
-        score_counter = 0
-
-        # no. of children
-        # if number of children <= 5: score = -1 + 2*(number of children / 5)
-        # else score = 1
-        if row['children'] <= 5:
-            score = score + (- 1 + 2 * (row['children'] / 5))
-            score_counter = score_counter + 1
-        else:
-            score = score + 1
-            score_counter = score_counter + 1
-
-        # if children: under which conditions
-        # 1 if married
-        # 0.5 if living with partner
-        # -0.5 if in stable relationship
-        # - 1 if not in stable relationship
-        if row['children'] > 0:
-            if row['married'] == 1:
-                score = score + 1
-                score_counter = score_counter + 1
-            elif row['living_with_partner'] == 1:
-                score = score + 0.5
-                score_counter = score_counter + 1
-            elif row['stable_relationship'] == 1:
-                score = score - 0.5
-                score_counter = score_counter + 1
-            else:
-                score = score - 1
-                score_counter = score_counter + 1
-
-        # child suffers if mother works
-        # if children
-        # if female more conservative if less work
-        # if male more conservative if partner less work
-        if row['children'] > 0:
-            if row['female'] == 1:
-                if row['work'] == 1:
-                    score = score - 1
-                    score_counter = score_counter + 1
-                elif row['work'] == 2:
-                    score = score - 0.5
-                    score_counter = score_counter + 1
-                elif row['work'] == 3:
-                    score = score + 0.5
-                    score_counter = score_counter + 1
-                elif row['work'] == 4:
-                    score = score + 1
-                    score_counter = score_counter + 1
-                else:
-                    score_counter = score_counter + 1
-            else:
-                if row['work_partner'] == 1:
-                    score = score - 1
-                    score_counter = score_counter + 1
-                elif row['work_partner'] == 2:
-                    score = score - 0.5
-                    score_counter = score_counter + 1
-                elif row['work_partner'] == 3:
-                    score = score + 0.5
-                    score_counter = score_counter + 1
-                elif row['work_partner'] == 4:
-                    score = score + 1
-                    score_counter = score_counter + 1
-                else:
-                    score_counter = score_counter + 1
-
-        # married
-        # yes = 1
-        # previously = 0
-        # never = -1
-        if row['married'] == 1:
-            score = score + 1
-            score_counter = score_counter + 1
-        elif row['married'] == 2:
-            score_counter = score_counter + 1
-        elif row['married'] == 3:
-            score = score - 1
-            score_counter = score_counter + 1
-
-        # children important for marriage
-        # if number of children <= 5: score = -1 + 2*(number of children / 5)
-        # else score = 1
-        if row['married'] < 3:
-            if row['children'] <= 5:
-                score = score + (- 1 + 2 * (row['children'] / 5))
-                score_counter = score_counter + 1
-            else:
-                score = score + 1
-                score_counter = score_counter + 1
-
-        # work
-        # if female: more work = more progressive
-        # if male: more work = more conservative
-        if row['female'] == 1:
-            if row['work'] == 1:
-                score = score - 1
-                score_counter = score_counter + 1
-            elif row['work'] == 2:
-                score = score - 0.5
-                score_counter = score_counter + 1
-            elif row['work'] == 3:
-                score = score + 0.5
-                score_counter = score_counter + 1
-            elif row['work'] == 4:
-                score = score + 1
-                score_counter = score_counter + 1
-            else:
-                score_counter = score_counter + 1
-        else:
-            if row['work'] == 1:
-                score = score + 1
-                score_counter = score_counter + 1
-            elif row['work'] == 2:
-                score = score + 0.5
-                score_counter = score_counter + 1
-            elif row['work'] == 3:
-                score = score - 0.5
-                score_counter = score_counter + 1
-            elif row['work'] == 4:
-                score = score - 1
-                score_counter = score_counter + 1
-            else:
-                score_counter = score_counter + 1
-
-        # could imagine working less
-        # conservative for women
-        # progressive for men
-        if row['work'] < 3:
-            if row['female'] == 1:
-                score = score + (-1 * row['dec_work'])
-                score_counter = score_counter + 1
-            else:
-                score = score + row['dec_work']
-                score_counter = score_counter + 1
-
-        # if in relationship: difference in education level
-        # women more progressive, if higher education than spouse
-        # men more conservative, if higher education than spouse
-        if row['stable_relationship'] == 1 or row['stable_relationship'] == -3:
-            education_difference = row['education'] - row['edu_spouse']
-            if row['female'] == 1:
-                score = score + (education_difference / 7)
-                score_counter = score_counter + 1
-            else:
-                score = score - (education_difference / 7)
-                score_counter = score_counter + 1
-
-        # education level:
-        # higher more progressive for women
-        # lower more progressive for men
-        if row['female'] == 1:
-            score = score + (1 - 2 * (-1 + row['education']) / 7)
-            score_counter = score_counter + 1
-        else:
-            score = score + (-1 + 2 * (-1 + row['education']) / 7)
-            score_counter = score_counter + 1
-
-        score = score / score_counter
-        score_list.append(score)
-        score_counter_list.append(score_counter)
-    df['fulfillment_score'] = score_list
-    df['fulfillment_score_counter'] = score_counter_list
-    return df
+    df = build(df, FULFILLMENT_ITEMS + ['female'])
+    children = df['children'].to_numpy()
+    married = df['married'].to_numpy()
+    living_with_partner = df['living_with_partner'].to_numpy()
+    stable_relationship = df['stable_relationship'].to_numpy()
+    work = df['work'].to_numpy()
+    work_partner = df['work_partner'].to_numpy()
+    dec_work = df['dec_work'].to_numpy()
+    education = df['education'].to_numpy()
+    edu_spouse = df['edu_spouse'].to_numpy()
+    female = df['female'].to_numpy() == 1
+    has_children = children > 0
+    score = np.zeros(len(df))
+    score_counter = np.zeros(len(df), dtype=np.int64)
+
+    # no. of children
+    # if number of children <= 5: score = -1 + 2*(number of children / 5)
+    # else score = 1
+    children_score = np.where(children <= 5, -1 + 2 * (children / 5), 1)
+    score = score + children_score
+    score_counter = score_counter + 1
+
+    # if children: under which conditions
+    # 1 if married
+    # 0.5 if living with partner
+    # -0.5 if in stable relationship
+    # - 1 if not in stable relationship
+    condition_score = np.select([married == 1, living_with_partner == 1, stable_relationship == 1],
+                                [1, 0.5, -0.5], -1)
+    score = add_score(score, condition_score, has_children)
+    score_counter = score_counter + has_children
+
+    # child suffers if mother works
+    # if children
+    # if female more conservative if less work
+    # if male more conservative if partner less work
+    work_mother = np.where(female, work, work_partner)
+    score = add_score(score, work_score(work_mother), has_children & np.isin(work_mother, [1, 2, 3, 4]))
+    score_counter = score_counter + has_children
+
+    # married
+    # yes = 1
+    # previously = 0
+    # never = -1
+    score = add_score(score, np.where(married == 1, 1, -1), (married == 1) | (married == 3))
+    score_counter = score_counter + np.isin(married, [1, 2, 3])
+
+    # children important for marriage
+    # if number of children <= 5: score = -1 + 2*(number of children / 5)
+    # else score = 1
+    score = add_score(score, children_score, married < 3)
+    score_counter = score_counter + (married < 3)
+
+    # work
+    # if female: more work = more progressive
+    # if male: more work = more conservative
+    score = add_score(score, np.where(female, 1, -1) * work_score(work), np.isin(work, [1, 2, 3, 4]))
+    score_counter = score_counter + 1
+
+    # could imagine working less
+    # conservative for women
+    # progressive for men
+    score = add_score(score, np.where(female, -1 * dec_work, dec_work), work < 3)
+    score_counter = score_counter + (work < 3)
+
+    # if in relationship: difference in education level
+    # women more progressive, if higher education than spouse
+    # men more conservative, if higher education than spouse
+    relationship = (stable_relationship == 1) | (stable_relationship == -3)
+    education_difference = education - edu_spouse
+    score = add_score(score, np.where(female, education_difference / 7, -(education_difference / 7)), relationship)
+    score_counter = score_counter + relationship
+
+    # education level:
+    # higher more progressive for women
+    # lower more progressive for men
+    score = score + np.where(female, 1 - 2 * (-1 + education) / 7, -1 + 2 * (-1 + education) / 7)
+    score_counter = score_counter + 1
+
+    df['fulfillment_score'] = score / score_counter
+    df['fulfillment_score_counter'] = score_counter
+    return df
+
+
+# adds value to score where condition is true
+# necessary for fulfillment_score
+def add_score(score, value, condition):
+    return np.where(condition, score + value, score)
+
+
+# score of employment status for fulfillment_score
+# full time = -1, part-time = -0.5, unemployed = 0.5, housewife = 1, others = 0
+def work_score(work):
+    return np.select([work == 1, work == 2, work == 3, work == 4], [-1, -0.5, 0.5, 1], 0)
 
 
 # measure of fulfillment of self-perceived gender-role
 # difference of prog_cons_score and fulfillment_score
 # 0 = perfect fulfillment of self-perceived role
 def fulfillment(df):
+    df = build(df, ['prog_cons_score', 'fulfillment_score'])
     df['fulfillment'] = (df['prog_cons_score'] - df['fulfillment_score'])
     return df
 
@@ -969,22 +870,7 @@ def fulfillment(df):
 # 6 = agree
 # 9 = strongly agree
 def men_better_leaders(df):
-    # remove missing
-    df['men_better_leaders'] = df['D059']
-    df = df[df.men_better_leaders != -5]
-    df = df[df.men_better_leaders != -4]
-    df = df[df.men_better_leaders != -3]
-    df = df[df.men_better_leaders != -2]
-    df = df[df.men_better_leaders != -1]
-    # recode
-    # 0 = strongly disagree
-    # 3 = disagree
-    # 6 = agree
-    # 9 = strongly agree
-    df['men_better_leaders'] = df['men_better_leaders'].replace([4], 0)
-    df['men_better_leaders'] = df['men_better_leaders'].replace([2], 6)
-    df['men_better_leaders'] = df['men_better_leaders'].replace([1], 9)
-    return df
+    return recode(df, 'men_better_leaders')
 
 
 # men make better business executives than women do
@@ -993,81 +879,79 @@ def men_better_leaders(df):
 # 6 = agree
 # 9 = strongly agree
 def men_better_executives(df):
-    # remove missing
-    df['men_better_executives'] = df['D078']
-    df = df[df.men_better_executives != -5]
-    df = df[df.men_better_executives != -4]
-    df = df[df.men_better_executives != -3]
-    df = df[df.men_better_executives != -2]
-    df = df[df.men_better_executives != -1]
-    # recode
-    # 0 = strongly disagree
-    # 3 = disagree
-    # 6 = agree
-    # 9 = strongly agree
-    df['men_better_executives'] = df['men_better_executives'].replace([4], 0)
-    df['men_better_executives'] = df['men_better_executives'].replace([2], 6)
-    df['men_better_executives'] = df['men_better_executives'].replace([1], 9)
-    return df
+    return recode(df, 'men_better_executives')
 
 
 # democracy: women have the same rights as men
 # 0 = an essential characteristic of democracy
 # 9 = it's against democracy
 def dem_same_rights(df):
-    # remove missing
-    df['dem_same_rights'] = df['E233']
-    df = df[df.dem_same_rights != -5]
-    df = df[df.dem_same_rights != -4]
-    df = df[df.dem_same_rights != -3]
-    df = df[df.dem_same_rights != -2]
-    df = df[df.dem_same_rights != -1]
-    # recode
-    # 0 = an essential characteristic of democracy
-    # 9 = it's against democracy
-    df['dem_same_rights'] = df['dem_same_rights'].replace([0], 1)
-    i = 10
-    while i > 0:
-        df['dem_same_rights'] = df['dem_same_rights'].replace([i], i * -1)
-        i = i - 1
-    i = 10
-    while i > 0:
-        df['dem_same_rights'] = df['dem_same_rights'].replace([-1 * i], i - 1)
-        i = i - 1
-    return df
+    return recode(df, 'dem_same_rights')
 
 
 # important for successful marriage: sharing household chores
 # 0 = very important
 # 9 = not very important
 def imp_marry_chores(df):
-    # remove missing
-    df['imp_marry_chores'] = df['D037']
-    df = df[df.imp_marry_chores != -5]
-    df = df[df.imp_marry_chores != -4]
-    df = df[df.imp_marry_chores != -3]
-    df = df[df.imp_marry_chores != -2]
-    df = df[df.imp_marry_chores != -1]
-    # recode
-    # 0 = very important
-    # 4.5 = rather important
-    # 9 = not very important
-    df['imp_marry_chores'] = df['imp_marry_chores'].replace([1], 0)
-    df['imp_marry_chores'] = df['imp_marry_chores'].replace([2], 4.5)
-    df['imp_marry_chores'] = df['imp_marry_chores'].replace([3], 9)
-    return df
+    return recode(df, 'imp_marry_chores')
 
 
 # sexism score
 # 0 = least sexist
 # 9 = most sexist
 def sexism(df):
-    df = men_better_leaders(df)
-    df = men_better_executives(df)
-    df = dem_same_rights(df)
-    df = imp_marry_chores(df)
+    df = build(df, SEXISM_ITEMS)
     df['sexism'] = (df['men_better_leaders'] +
                     df['men_better_executives'] +
                     df['imp_marry_chores'] +
                     df['dem_same_rights']) / 4
     return df
+
+
+# dependency graph of the variables created by prepare_data
+# variable: (function creating the variable, variables necessary for the function)
+# evs_2017 and non_democratic only mark participants for removal
+VARIABLES = {
+    'evs_2017': (evs_2017, []),
+    'interview_conducted': (interview_conducted, []),
+    'non_democratic': (remove_non_democratic, ['interview_conducted']),
+    'social_class': (social_class, []),
+    'former_socialist_country': (former_socialist_country, ['interview_conducted']),
+    'age': (age, []),
+    'weight': (weight, []),
+    'female': (female, []),
+    'econ_env': (econ_env, []),
+    'inc_ineq': (inc_ineq, []),
+    'imp_ancestry': (imp_ancestry, []),
+    'respect_inst_laws': (respect_inst_laws, []),
+    'no_work_lazy': (no_work_lazy, []),
+    'left_right': (left_right, []),
+    'duty_work': (duty_work, []),
+    'men_right_job': (men_right_job, []),
+    'marry_outdated': (marry_outdated, []),
+    'duty_children': (duty_children, []),
+    'imp_marry_child': (imp_marry_child, []),
+    'child_suffers': (child_suffers, []),
+    'wom_hom_child': (wom_hom_child, []),
+    'imp_work': (imp_work, []),
+    'university_important_prog_cons': (university_important_prog_cons, []),
+    'children': (children, []),
+    'married': (married, []),
+    'living_with_partner': (living_with_partner, []),
+    'stable_relationship': (stable_relationship, []),
+    'work': (work, []),
+    'work_partner': (work_partner, []),
+    'dec_work': (dec_work, []),
+    'education': (education, []),
+    'edu_spouse': (edu_spouse, []),
+    'men_better_leaders': (men_better_leaders, []),
+    'men_better_executives': (men_better_executives, []),
+    'dem_same_rights': (dem_same_rights, []),
+    'imp_marry_chores': (imp_marry_chores, []),
+    'sys_jus': (sys_jus, SYS_JUS_ITEMS),
+    'prog_cons_score': (prog_cons_score, PROG_CONS_ITEMS + ['female']),
+    'prog_con': (assign_prog_con, ['prog_cons_score']),
+    'fulfillment_score': (fulfillment_score, FULFILLMENT_ITEMS + ['female']),
+    'fulfillment': (fulfillment, ['prog_cons_score', 'fulfillment_score']),
+    'sexism': (sexism, SEXISM_ITEMS),
+}
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+
+"""\
+file computing descriptive statistics of variables in a single pass
+the statistics of chunks (e.g. waves, files or parts of a file) are computed separately and merged,
+so the data never has to be in memory at once
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# quantiles of the description (as in pandas.DataFrame.describe)
+QUANTILES = [0.25, 0.5, 0.75]
+
+
+# descriptive statistics of the columns of a DataFrame
+# input: DataFrame, columns, grouping columns (e.g. ['interview_conducted', 'female']), column of the weights,
+#   decimals the values are rounded to for the quantiles (None = exact quantiles)
+# returns DataFrame in the layout of pandas.DataFrame.describe(include='all'), with groups as outer index levels
+def describe(df, cols, by=None, weight=None, decimals=None):
+    return summary(chunk_stats(df, cols, by, weight, decimals))
+
+
+# descriptive statistics of chunks (e.g. the chunks of pd.read_stata or the waves of data_handler.prepare_waves)
+# returns DataFrame as describe
+def describe_chunks(chunks, cols, by=None, weight=None, decimals=None):
+    stats = None
+    for chunk in chunks:
+        stats = merge_stats(stats, chunk_stats(chunk, cols, by, weight, decimals))
+    return summary(stats)
+
+
+# descriptive statistics of Parquet files, the files are processed in parallel worker processes
+# input: list of files, as describe, number of worker processes (None = all cores, 1 = no pool)
+# returns DataFrame as describe
+def describe_files(filenames, cols, by=None, weight=None, decimals=None, workers=None):
+    n = len(filenames)
+    arguments = (filenames, [cols] * n, [by] * n, [weight] * n, [decimals] * n)
+    if workers == 1:
+        results = map(file_stats, *arguments)
+        return summary(merge_all(results))
+    with ProcessPoolExecutor(workers) as executor:
+        return summary(merge_all(executor.map(file_stats, *arguments)))
+
+
+# necessary for describe_files
+# statistics of the columns needed from a Parquet file
+def file_stats(filename, cols, by=None, weight=None, decimals=None):
+    columns = list(dict.fromkeys(list(cols) + list(by or []) + ([weight] if weight is not None else [])))
+    return chunk_stats(pd.read_parquet(filename, columns=columns), cols, by, weight, decimals)
+
+
+# necessary for describe_files
+# merges the statistics of all chunks
+def merge_all(results):
+    stats = None
+    for result in results:
+        stats = merge_stats(stats, result)
+    return stats
+
+
+# statistics of a chunk
+# moments: count, sum of the weights, weighted mean, weighted sum of squared deviations from the mean,
+#   minimum and maximum per group and numeric variable, computed with grouped sums (two passes over the chunk)
+# values: count and sum of the weights per group, variable and value (for quantiles and non-numeric variables)
+# returns dict {'moments': DataFrame, 'values': DataFrame, 'cols', 'by', 'weighted'}
+def chunk_stats(df, cols, by=None, weight=None, decimals=None):
+    by = list(by or [])
+    keys = {'group_' + str(i): df[col].to_numpy() for i, col in enumerate(by)}
+    if len(by) == 0:
+        keys = {'group': np.zeros(len(df), dtype=np.int8)}
+    weights = np.ones(len(df)) if weight is None else df[weight].to_numpy(dtype=float)
+    moments = list()
+    values = list()
+    for col in cols:
+        column = df[col]
+        numeric = is_numeric(column)
+        x = column.to_numpy(dtype=float) if numeric else column.to_numpy(dtype=object)
+        valid = ~pd.isna(x) & ~np.isnan(weights)
+        frame = pd.DataFrame({name: key[valid] for name, key in keys.items()})
+        frame['w'] = weights[valid]
+        frame['x'] = x[valid]
+        if numeric:
+            frame['wx'] = frame['w'] * frame['x']
+            groups = frame.groupby(list(keys), observed=True, sort=False)
+            mean = groups['wx'].transform('sum') / groups['w'].transform('sum')
+            frame['d'] = frame['w'] * (frame['x'] - mean) ** 2
+            stats = groups.agg(count=('x', 'size'), weight=('w', 'sum'), wx=('wx', 'sum'), m2=('d', 'sum'),
+                               min=('x', 'min'), max=('x', 'max'))
+            stats['mean'] = stats.pop('wx') / stats['weight']
+            stats['variable'] = col
+            moments.append(stats.set_index('variable', append=True))
+            if decimals is not None:
+                frame['x'] = frame['x'].round(decimals)
+        counts = frame.groupby(list(keys) + ['x'], observed=True, sort=False).agg(count=('w', 'size'),
+                                                                                  weight=('w', 'sum'))
+        counts['variable'] = col
+        values.append(counts.set_index('variable', append=True))
+    return {'moments': pd.concat(moments) if len(moments) > 0 else None,
+            'values': pd.concat(values),
+            'cols': list(cols),
+            'numeric': [col for col in cols if is_numeric(df[col])],
+            'by': by,
+            'weighted': weight is not None}
+
+
+# necessary for chunk_stats
+# numeric variables are described by moments and quantiles, the others by unique values and most frequent value
+def is_numeric(column):
+    return column.dtype.kind in 'iuf'
+
+
+# merges the statistics of two chunks
+# the moments are merged by the formula of Chan et al. (parallel version of Welford's algorithm)
+# returns dict as chunk_stats
+def merge_stats(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    merged = dict(a)
+    merged['values'] = pd.concat([a['values'], b['values']]).groupby(
+        level=list(range(a['values'].index.nlevels)), observed=True, sort=False).sum()
+    if a['moments'] is None or b['moments'] is None:
+        merged['moments'] = b['moments'] if a['moments'] is None else a['moments']
+        return merged
+    index = a['moments'].index.union(b['moments'].index, sort=False)
+    empty = {'count': 0, 'weight': 0.0, 'm2': 0.0, 'min': np.inf, 'max': -np.inf, 'mean': 0.0}
+    x = a['moments'].reindex(index).fillna(empty)
+    y = b['moments'].reindex(index).fillna(empty)
+    weight = x['weight'] + y['weight']
+    delta = y['mean'] - x['mean']
+    moments = pd.DataFrame({'count': x['count'] + y['count'],
+                            'weight': weight,
+                            'm2': x['m2'] + y['m2'] + delta ** 2 * x['weight'] * y['weight'] / weight,
+                            'min': np.minimum(x['min'], y['min']),
+                            'max': np.maximum(x['max'], y['max']),
+                            'mean': x['mean'] + delta * y['weight'] / weight}, index=index)
+    merged['moments'] = moments
+    return merged
+
+
+# description of the merged statistics
+# numeric variables: count, (sum of the weights,) mean, standard deviation, minimum, quantiles, maximum
+# other variables: count, number of unique values, most frequent value and its frequency (weighted if weighted)
+# unweighted quantiles are interpolated linearly (as pandas), weighted quantiles are the smallest value
+# reaching the share of the weights
+# returns DataFrame in the layout of pandas.DataFrame.describe(include='all')
+def summary(stats, quantiles=QUANTILES):
+    cols = stats['cols']
+    numeric = [col for col in cols if col in stats['numeric']]
+    rows = ['count']
+    if stats['weighted']:
+        rows.append('weight')
+    if len(numeric) < len(cols):
+        rows += ['unique', 'top', 'freq']
+    if len(numeric) > 0:
+        rows += ['mean', 'std', 'min'] + [format_quantile(q) for q in quantiles] + ['max']
+
+    values = stats['values']
+    group_levels = list(range(values.index.nlevels - 2))
+    tables = dict()
+    for (*group, col), counts in values.groupby(level=group_levels + [values.index.nlevels - 1], sort=False):
+        group = tuple(group)
+        table = tables.setdefault(group, pd.DataFrame(np.nan, index=rows, columns=cols, dtype=object))
+        counts = counts.droplevel(group_levels + [values.index.nlevels - 1])
+        table.loc['count', col] = counts['count'].sum()
+        if stats['weighted']:
+            table.loc['weight', col] = counts['weight'].sum()
+        if col in numeric:
+            moments = stats['moments'].loc[group + (col,)]
+            table.loc['mean', col] = moments['mean']
+            table.loc['std', col] = np.sqrt(moments['m2'] / (moments['weight'] - 1)) \
+                if moments['weight'] > 1 else np.nan
+            table.loc['min', col] = moments['min']
+            table.loc['max', col] = moments['max']
+            counts = counts.sort_index()
+            for q in quantiles:
+                table.loc[format_quantile(q), col] = quantile(counts, q, stats['weighted'])
+        else:
+            frequency = counts['weight'] if stats['weighted'] else counts['count']
+            table.loc['unique', col] = len(counts)
+            table.loc['top', col] = frequency.idxmax()
+            table.loc['freq', col] = frequency.max()
+
+    groups = sorted(tables, key=str)
+    if len(stats['by']) == 0:
+        return tables[groups[0]].infer_objects() if len(groups) > 0 else None
+    result = pd.concat([tables[group] for group in groups],
+                       keys=[group if len(group) > 1 else group[0] for group in groups],
+                       names=stats['by'] + [None])
+    return result.infer_objects()
+
+
+# necessary for summary
+# quantile of a variable from its values sorted with count and sum of the weights
+def quantile(counts, q, weighted=False):
+    values = counts.index.to_numpy(dtype=float)
+    if weighted:
+        cumulative = counts['weight'].cumsum().to_numpy()
+        return values[min(np.searchsorted(cumulative, q * cumulative[-1], 'left'), len(values) - 1)]
+    cumulative = counts['count'].cumsum().to_numpy()
+    position = (cumulative[-1] - 1) * q
+    low = values[np.searchsorted(cumulative, np.floor(position), 'right')]
+    high = values[np.searchsorted(cumulative, np.ceil(position), 'right')]
+    return low + (position - np.floor(position)) * (high - low)
+
+
+# necessary for summary
+# name of the quantile as in pandas (e.g. 25%)
+def format_quantile(q):
+    return '{:g}%'.format(q * 100)
@@ -2,45 +2,108 @@
 
 """\
 file handling the creation of graphs and tables
+matplotlib, Stargazer and scipy are imported by the functions using them,
+so importing this file (e.g. by analysis.py) does not load them
 """
 
-import matplotlib.pyplot as plt
+import os
+
 import numpy as np
-from stargazer.stargazer import Stargazer, LineLocation
-import scipy.stats as stats
+import pandas as pd
+
+import regression as reg
+import tables
 
 __author__ = 'Moritz Möckel'
 __email__ = 'mmoecke2@smail.uni-koeln.de'
 __status__ = 'finished'
 __date__ = '10.07.2024'
 
+# colors of the categories of scatter
+COLORS = ['blue', 'red', 'green', 'orange', 'yellow', 'purple', 'pink']
+
+
 # plots a simple scatterplot
 # different categories can be marked if the corresponding variable name and the categories to be marked are passed
-def scatter(df, var_x, var_y, color_col='', color_col_vals=[]):
-    df_list = list()
-    color_list = ['blue', 'red', 'green', 'orange', 'yellow', 'purple', 'pink']
+# (the data is split into the categories in one groupby pass)
+# filename = path without extension: the plot is rendered without a display and saved in the formats passed
+# (e.g. ['png', 'pdf']), otherwise it is shown
+# ax = axes to draw on (cleared first, e.g. to reuse the figure for many plots as scatter_batch)
+def scatter(df, var_x, var_y, color_col='', color_col_vals=[], filename=None, formats=('png',), ax=None):
+    # pyplot is only imported to show the plot
+    if filename is None:
+        import matplotlib.pyplot as plt
+    if ax is None:
+        ax = new_figure().subplots() if filename is not None else plt.gca()
+    else:
+        ax.clear()
     if color_col != '':
-        for val in color_col_vals:
-            df_list.append(df[df[color_col] == val])
-        i = 0
-        for d in df_list:
-            plt.scatter(d[var_x], d[var_y], c=color_list[i])
-            plt.title(var_y + ' vs. ' + var_x)
-            plt.ylabel(var_y)
-            plt.xlabel(var_x)
-            i = i + 1
-        plt.grid()
-        plt.show()
+        groups = df.groupby(color_col, observed=True, sort=False).indices
+        frame = df[[var_x, var_y]]
+        for i, val in enumerate(color_col_vals):
+            if val in groups:
+                d = frame.iloc[groups[val]]
+                ax.scatter(d[var_x], d[var_y], c=COLORS[i])
+    else:
+        ax.scatter(df[var_x], df[var_y])
+    ax.set_title(var_y + ' vs. ' + var_x)
+    ax.set_ylabel(var_y)
+    ax.set_xlabel(var_x)
+    ax.grid()
+    if filename is not None:
+        return save_figure(ax.figure, filename, formats)
+    plt.show()
+
+
+# plots many scatterplots without a display, one figure is reused for all plots
+# input: DataFrame, list of (var_x, var_y), directory, formats,
+#   by = column with one plot per value (e.g. 'interview_conducted'), the data is split in one groupby pass,
+#   as scatter
+# the files are named <var_y>_vs_<var_x>(_<value of by>).<format>
+# returns list of the files written
+def scatter_batch(df, plots, directory, formats=('png',), by=None, color_col='', color_col_vals=[]):
+    os.makedirs(directory, exist_ok=True)
+    columns = list(dict.fromkeys([col for plot in plots for col in plot] + ([color_col] if color_col != '' else [])))
+    if by is None:
+        parts = [('', df[columns])]
     else:
-        plt.scatter(df[var_x], df[var_y])
-        plt.title(var_y + ' vs. ' + var_x)
-        plt.ylabel(var_y)
-        plt.xlabel(var_x)
-        plt.grid()
-        plt.show()
+        frame = df[columns]
+        parts = [('_' + str(key), frame.iloc[rows])
+                 for key, rows in df.groupby(by, observed=True, sort=True).indices.items()]
+    ax = new_figure().subplots()
+    files = list()
+    for suffix, part in parts:
+        for var_x, var_y in plots:
+            filename = os.path.join(directory, var_y + '_vs_' + var_x + suffix)
+            files += scatter(part, var_x, var_y, color_col, color_col_vals, filename, formats, ax)
+    return files
+
+
+# necessary for scatter, scatter_batch and scatter_fit
+# figure independent of pyplot, rendered without a display (not registered by pyplot, so it is not kept open)
+def new_figure(figsize=None):
+    from matplotlib.figure import Figure
+
+    return Figure(figsize=figsize)
+
+
+# necessary for scatter and scatter_fit
+# saves a figure in every format passed (filename without extension)
+# returns list of the files written
+def save_figure(fig, filename, formats=('png',), **kwargs):
+    files = list()
+    for extension in formats:
+        files.append(filename + '.' + extension)
+        fig.savefig(files[-1], format=extension, **kwargs)
+    return files
 
 
 # creates an HTML-table with regression result of the models passed
+# show_confidence_intervals = True shows confidence intervals instead of standard errors
+# (for models of regression.bootstrap the bootstrap intervals)
+# renderer = 'native' renders the table with tables.render (same layout, cached cells, no Stargazer object)
+# the models can be fitted models or results loaded by regression.load_results
+# returns Stargazer object or HTML of the native renderer
 def create_html_table(models,
                       filename,
                       title='',
@@ -54,7 +117,24 @@ def create_html_table(models,
                       show_f_statistic=False,
                       show_n=False,
                       show_residual_std_error=False,
-                      dep_var_list=[]):
+                      dep_var_list=[],
+                      show_confidence_intervals=False,
+                      renderer='stargazer'):
+    if renderer == 'native':
+        html = tables.render(models, ('html',), title=title, custom_columns=custom_columns,
+                             show_model_numbers=show_model_numbers, significant_digits=significant_digits,
+                             covariate_order=covariate_order, rename_covariates=rename_covariates,
+                             degrees_of_freedom=degrees_of_freedom, custom_notes=custom_notes,
+                             show_f_statistic=show_f_statistic, show_n=show_n,
+                             show_residual_std_error=show_residual_std_error, dep_var_list=dep_var_list,
+                             show_confidence_intervals=show_confidence_intervals)['html']
+        with open(filename, 'w') as file:
+            file.write(html)
+        return html
+    from stargazer.stargazer import Stargazer, LineLocation
+    from stargazer.translators import register_class
+
+    register_class(reg.StoredResults, stored_model_data)
     stargazer = Stargazer(models)
     if title != '':
         stargazer.title(title)
@@ -70,46 +150,91 @@ def create_html_table(models,
     stargazer.show_f_statistic = show_f_statistic
     stargazer.show_n = show_n
     stargazer.show_residual_std_err = show_residual_std_error
+    stargazer.show_confidence_intervals(show_confidence_intervals)
     if len(custom_notes) > 0:
         stargazer.add_custom_notes(custom_notes)
     if len(dep_var_list) > 0:
         stargazer.add_line('Dependent variable', dep_var_list, LineLocation.HEADER_BOTTOM)
-    file = open(filename, 'w')
-    file.write(stargazer.render_html())
-    file.close()
+    with open(filename, 'w') as file:
+        file.write(stargazer.render_html())
     return stargazer
 
 
+# necessary for create_html_table
+# data of regression.StoredResults as extracted by the translators of Stargazer
+def stored_model_data(results):
+    intervals = results.conf_int()
+    return {'p_values': results.pvalues,
+            'cov_values': results.params,
+            'cov_std_err': results.bse,
+            'r2': results.rsquared,
+            'r2_adj': results.rsquared_adj,
+            'pseudo_r2': None,
+            'f_p_value': results.f_pvalue,
+            'degree_freedom': results.df_model,
+            'degree_freedom_resid': results.df_resid,
+            'nobs': results.nobs,
+            'f_statistic': results.fvalue,
+            'dependent_variable': results.model.endog_names,
+            'cov_names': results.params.index.values,
+            'conf_int_low_values': intervals[0],
+            'conf_int_high_values': intervals[1],
+            'resid_std_err': np.sqrt(results.ssr / results.df_resid)}
+
+
 # creates a scatter plot featuring a fitted regression line
-def scatter_fit(df, xtitle, ytitle, r_sq, intercept, coef, title=''):
+# density = 'hexbin' or 'heatmap' draws the number of respondents in 2D bins instead of every respondent
+# (the time to render does not depend on the sample size)
+# model = fitted regression of ytitle on xtitle (e.g. m1, also loaded by regression.load_results), the fit,
+# confidence and prediction limits and the R², slope and intercept shown are taken from the model
+# (otherwise from a linear fit of the data) on a grid of points values
+# r_sq, intercept, coef = values shown if no model is passed (None = from the linear fit)
+# filename = path without extension: the plot is rendered without a display and saved in the formats passed,
+# otherwise it is shown
+# ax = axes to draw on (cleared first, e.g. to reuse the figure for many plots)
+# returns list of the files written
+def scatter_fit(df, xtitle, ytitle, r_sq=None, intercept=None, coef=None, title='', model=None, density=None,
+                gridsize=50, points=100, filename=None, formats=('png',), ax=None):
+    from matplotlib.lines import Line2D
+
+    # pyplot is only imported to show the plot
+    if filename is None:
+        import matplotlib.pyplot as plt
     x = df[xtitle]
     y = df[ytitle]
-    p, cov = np.polyfit(x, y, 1, cov=True)
-    y_model = equation(p, x)
-    n = y.size
-    m = p.size
-    dof = n - m
-    t = stats.t.ppf(0.975, n - m)
-    resid = y - y_model
-    chi2 = np.sum((resid / y_model) ** 2)
-    chi2_red = chi2 / dof
-    s_err = np.sqrt(np.sum(resid ** 2) / dof)
-
-    fig, ax = plt.subplots(figsize=(15, 9))
-    ax.scatter(x, y, s=50, alpha=0.7, edgecolors='k')
-
-    b, a = np.polyfit(x, y, deg=1)
-    xseq = np.linspace(x.min(), x.max(), num=len(df))
-    y2 = equation(p, xseq)
-
-    ax.plot(xseq, a + b * xseq, color='r', lw=2.5, linestyle='--', label='Fit')
+    xseq = np.linspace(x.min(), x.max(), num=points)
+    y2, ci, pi = fit_limits(x, y, xseq, model)
+    if model is not None:
+        r_sq, intercept, coef = model.rsquared, model.params.get('Intercept', 0.0), model.params[xtitle]
+    elif r_sq is None or intercept is None or coef is None:
+        slope, constant = np.polyfit(x, y, 1)
+        r_sq = np.corrcoef(x, y)[0, 1] ** 2 if r_sq is None else r_sq
+        intercept = constant if intercept is None else intercept
+        coef = slope if coef is None else coef
+
+    if ax is not None:
+        ax.clear()
+        fig = ax.figure
+    elif filename is None:
+        fig, ax = plt.subplots(figsize=(15, 9))
+    else:
+        fig = new_figure(figsize=(15, 9))
+        ax = fig.subplots()
+    if density == 'hexbin':
+        ax.hexbin(x, y, gridsize=gridsize, cmap='Blues', mincnt=1)
+    elif density == 'heatmap':
+        counts, x_edges, y_edges = np.histogram2d(x, y, bins=gridsize)
+        ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap='Blues')
+    else:
+        ax.scatter(x, y, s=50, alpha=0.7, edgecolors='k')
+
+    ax.plot(xseq, y2, color='r', lw=2.5, linestyle='--', label='Fit')
     ax.text(-1.4, 9, r'$R^2 =$' + str(round(r_sq, 4)), fontsize=16, weight='bold', horizontalalignment='left')
     ax.text(-1.4, 8.5, r'$\hat\beta_1 =$' + str(round(coef, 4)), fontsize=16, weight='bold',
             horizontalalignment='left')
     ax.text(-1.4, 8, r'$\hat\beta_0 =$' + str(round(intercept, 4)), fontsize=16, weight='bold',
             horizontalalignment='left')
-    plot_ci_manual(t, s_err, n, x, xseq, y2, ax=ax)
-    pi = t * s_err * np.sqrt(1 + 1 / n + (xseq - np.mean(x)) ** 2 / np.sum((x - np.mean(x)) ** 2))
+    ax.fill_between(xseq, y2 + ci, y2 - ci, color='mistyrose', alpha=0.7 if density else 1)
     ax.fill_between(xseq, y2 + pi, y2 - pi, color='None', linestyle='--')
     ax.plot(xseq, y2 - pi, '--', color='orange', label='95% Prediction Limits')
     ax.plot(xseq, y2 + pi, '--', color='orange')
@@ -120,29 +245,38 @@ def scatter_fit(df, xtitle, ytitle, r_sq, intercept, coef, title=''):
     for label in (ax.get_xticklabels() + ax.get_yticklabels()): label.set_fontsize(12)
     handles, labels = ax.get_legend_handles_labels()
     display = (0, 1)
-    anyArtist = plt.Line2D((0, 1), (0, 0), color='mistyrose', lw=5)
-    legend = plt.legend(
+    anyArtist = Line2D((0, 1), (0, 0), color='mistyrose', lw=5)
+    legend = ax.legend(
         [handle for i, handle in enumerate(handles) if i in display] + [anyArtist],
         [label for i, label in enumerate(labels) if i in display] + ['95% Confidence Limits'],
         loc=9, bbox_to_anchor=(0, -0.21, 1., 0.102), ncol=3, mode='expand', fontsize=16
     )
     legend.get_frame().set_edgecolor('0.5')
-    plt.grid()
-    plt.tight_layout()
-    plt.savefig('filename.png', bbox_extra_artists=(legend,), bbox_inches='tight')
+    ax.grid()
+    fig.tight_layout()
+    if filename is not None:
+        return save_figure(fig, filename, formats, bbox_extra_artists=(legend,), bbox_inches='tight')
     plt.show()
 
 
 # necessary for scatter_fit
-# plots confidence intervals
-def plot_ci_manual(t, s_err, n, x, x2, y2, ax=None):
-    if ax is None:
-        ax = plt.gca()
-
-    ci = t * s_err * np.sqrt(1 / n + (x2 - np.mean(x)) ** 2 / np.sum((x - np.mean(x)) ** 2))
-    ax.fill_between(x2, y2 + ci, y2 - ci, color='mistyrose')
+# fitted values and half widths of the confidence and prediction limits on the grid xseq
+# from the fitted model if passed (no refit), otherwise from a linear fit of y on x
+# returns tuple of numpy arrays (fitted values, confidence, prediction)
+def fit_limits(x, y, xseq, model=None, alpha=0.05):
+    import scipy.stats as stats
 
-    return ax
+    if model is not None:
+        frame = model.get_prediction(pd.DataFrame({x.name: xseq})).summary_frame(alpha)
+        y2 = frame['mean'].to_numpy()
+        return y2, frame['mean_ci_upper'].to_numpy() - y2, frame['obs_ci_upper'].to_numpy() - y2
+    p = np.polyfit(x, y, 1)
+    n = y.size
+    dof = n - p.size
+    t = stats.t.ppf(1 - alpha / 2, dof)
+    s_err = np.sqrt(np.sum((y - equation(p, x)) ** 2) / dof)
+    spread = 1 / n + (xseq - np.mean(x)) ** 2 / np.sum((x - np.mean(x)) ** 2)
+    return equation(p, xseq), t * s_err * np.sqrt(spread), t * s_err * np.sqrt(1 + spread)
 
 
 # necessary for scatter_fit
@@ -1,10 +1,20 @@
 #!/usr/bin/env python
 
 """\
-file containing the regression function
+file containing the regression function and the store of the results of fitted models
+statsmodels, patsy and scipy are imported by the functions using them,
+so importing this file (e.g. by the worker processes or analysis.py) does not load them
 """
 
-import statsmodels.formula.api as smf
+import copy
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import cache
 
 __author__ = 'Moritz Möckel'
 __email__ = 'mmoecke2@smail.uni-koeln.de'
@@ -17,19 +27,489 @@ __date__ = '10.07.2024'
 # optional: intercept = False if intercept is not wanted
 # returns OLS-regression model
 def regression(df, dependent_var, independent_var_list, intercept=True):
-    reg_str = dependent_var + ' ~ '
-    i = 1
-    var_len = len(independent_var_list)
-    for var in independent_var_list:
-        if i < var_len:
-            reg_str = reg_str + var + ' + '
-            i = i + 1
-        else:
-            reg_str = reg_str + var
-    if not intercept:
-        reg_str = reg_str + ' -1'
+    import statsmodels.formula.api as smf
+
+    reg_str = formula(dependent_var, independent_var_list, intercept)
     try:
         model = smf.ols(formula=reg_str, data=df).fit()
     except:
         print('Error when running regression')
     return model
+
+
+# creates the formula of a regression
+# returns formula as string (e.g. 'sys_jus ~ fulfillment + sexism')
+def formula(dependent_var, independent_var_list, intercept=True):
+    reg_str = dependent_var + ' ~ ' + ' + '.join(independent_var_list)
+    if not intercept:
+        reg_str = reg_str + ' -1'
+    return reg_str
+
+
+# fits a family of regressions on the same DataFrame
+# the design matrix containing the variables of all models is built once
+# every model is solved from the cross-products of this matrix (X'X, X'y) computed once
+# models without intercept, with interactions or with missing values are fitted separately by regression
+# input: DataFrame, list of models as (dependent variable, list of independent variables[, intercept])
+# returns list of OLS-regression models in the order of the models passed
+def regression_family(df, models):
+    import patsy
+
+    specs = [(m[0], list(m[1]), m[2] if len(m) > 2 else True) for m in models]
+    descs = [patsy.ModelDesc.from_formula(formula(*spec)) for spec in specs]
+    batch = [i for i, desc in enumerate(descs) if shared_design_possible(desc)]
+    results = [None] * len(specs)
+
+    if len(batch) > 0:
+        # design containing the dependent and independent variables of all models in the batch
+        terms = [patsy.INTERCEPT]
+        for i in batch:
+            for term in descs[i].lhs_termlist + descs[i].rhs_termlist:
+                if term not in terms:
+                    terms.append(term)
+        design = patsy.dmatrix(patsy.ModelDesc([], terms), df, eval_env=1, return_type='dataframe')
+        if len(design) < len(df):
+            # rows with missing values differ between the models
+            batch = []
+        else:
+            values = design.to_numpy()
+            cross_products = values.T @ values
+            for i in batch:
+                results[i] = shared_design_fit(design, values, cross_products, descs[i], specs[i])
+
+    for i, spec in enumerate(specs):
+        if results[i] is None:
+            results[i] = regression(df, *spec)
+    return results
+
+
+# checks if a model can be fitted from the shared design of regression_family
+# necessary: intercept, a single dependent variable, only main effects
+# (otherwise patsy codes categorical variables depending on the other terms of the model)
+def shared_design_possible(desc):
+    import patsy
+
+    if patsy.INTERCEPT not in desc.rhs_termlist:
+        return False
+    if len(desc.lhs_termlist) != 1 or len(desc.lhs_termlist[0].factors) != 1:
+        return False
+    return all(len(term.factors) <= 1 for term in desc.rhs_termlist)
+
+
+# fits a single model of regression_family from the shared cross-products
+# returns OLS-regression model equal to the model fitted by regression
+def shared_design_fit(design, values, cross_products, desc, spec):
+    from statsmodels.regression.linear_model import OLS, OLSResults, RegressionResultsWrapper
+
+    info = design.design_info
+    # order of the terms as in a separately built design: intercept, categorical variables, numeric variables
+    terms = [term for term in desc.rhs_termlist if len(term.factors) == 0]
+    terms += [term for term in desc.rhs_termlist
+              if len(term.factors) == 1 and info.factor_infos[term.factors[0]].type == 'categorical']
+    terms += [term for term in desc.rhs_termlist if term not in terms]
+    cols = np.concatenate([np.arange(len(info.column_names))[info.term_slices[term]] for term in terms])
+    y_col = info.term_slices[desc.lhs_termlist[0]].start
+
+    xtx = cross_products[np.ix_(cols, cols)]
+    xty = cross_products[cols, y_col]
+    if np.linalg.matrix_rank(xtx) < len(cols):
+        # collinear variables, statsmodels uses the pseudo-inverse
+        return None
+    normalized_cov_params = np.linalg.inv(xtx)
+    params = normalized_cov_params @ xty
+    nobs = len(values)
+    ssr = max(cross_products[y_col, y_col] - params @ xty, 0)
+
+    exog = pd.DataFrame(values[:, cols], index=design.index, columns=[info.column_names[c] for c in cols])
+    endog = pd.Series(values[:, y_col], index=design.index, name=info.column_names[y_col])
+    model = OLS(endog, exog, hasconst=True)
+    model.formula = formula(*spec)
+    # design of the model for predictions (design_info up to statsmodels 0.14, model_spec from 0.15)
+    model.data.design_info = model.data.model_spec = info.subset(terms)
+    model.rank = len(cols)
+    model.df_model = len(cols) - 1
+    model.df_resid = nobs - len(cols)
+    model.wexog_singular_values = np.sqrt(np.clip(np.linalg.eigvalsh(xtx)[::-1], 0, None))
+    model.normalized_cov_params = normalized_cov_params
+    results = OLSResults(model, params, normalized_cov_params=normalized_cov_params,
+                         scale=ssr / model.df_resid)
+    return RegressionResultsWrapper(results)
+
+
+# fits a family of regressions separately per group (e.g. per country)
+# the DataFrame is partitioned once, only the columns used by the models are passed on,
+# the groups are fitted by regression_family on a process pool (largest groups first)
+# input: DataFrame, list of models as in regression_family, grouping column,
+#   number of worker processes (None = all cores, 1 = no pool), alpha of the confidence intervals,
+#   names of the models (None = numbered from 1)
+# returns DataFrame with one row per group, model and coefficient
+def grouped_regression(df, models, by='interview_conducted', workers=None, alpha=0.05, names=None):
+    columns = [by] + [column for column in model_columns(df, models) if column != by]
+    groups = list(df[columns].groupby(by, sort=True, observed=True))
+    groups.sort(key=lambda group: len(group[1]), reverse=True)
+    keys = [key for key, group in groups]
+    frames = [group for key, group in groups]
+    n = len(groups)
+    if workers == 1:
+        tables = list(map(coefficient_table, keys, frames, [models] * n, [alpha] * n))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            tables = list(executor.map(coefficient_table, keys, frames, [models] * n, [alpha] * n))
+    table = pd.concat(tables, ignore_index=True).rename(columns={'group': by})
+    table = table.sort_values([by, 'model'], kind='stable', ignore_index=True)
+    if names is not None:
+        table['model'] = np.asarray(names, dtype=object)[table['model'].to_numpy() - 1]
+    return table
+
+
+# columns of the DataFrame used in the formulas of the models
+def model_columns(df, models):
+    text = ' '.join(formula(*model) for model in models)
+    return [column for column in df.columns if re.search(r'\b' + re.escape(str(column)) + r'\b', text)]
+
+
+# necessary for grouped_regression
+# fits the models of one group
+# a model failing in the group (e.g. a reference level of C() without rows) or with collinear variables
+# (e.g. a variable constant within the group) gets one row with NaN and the error
+# returns DataFrame with estimate, standard error, t, p, confidence interval, observations, R² and error
+#   per coefficient
+def coefficient_table(key, df, models, alpha=0.05):
+    tables = []
+    for i, model in enumerate(fit_group(df, models)):
+        if not isinstance(model, str) and model.model.rank < model.model.exog.shape[1]:
+            model = rank_error(model)
+        if isinstance(model, str):
+            tables.append(pd.DataFrame({'group': [key], 'model': i + 1, 'dependent': models[i][0],
+                                        'term': None, 'coef': np.nan, 'std_err': np.nan, 't': np.nan,
+                                        'p': np.nan, 'ci_low': np.nan, 'ci_high': np.nan, 'nobs': 0,
+                                        'rsquared': np.nan, 'error': model}))
+            continue
+        ci = model.conf_int(alpha)
+        tables.append(pd.DataFrame({'group': key,
+                                    'model': i + 1,
+                                    'dependent': model.model.endog_names,
+                                    'term': model.params.index,
+                                    'coef': model.params.to_numpy(),
+                                    'std_err': model.bse.to_numpy(),
+                                    't': model.tvalues.to_numpy(),
+                                    'p': model.pvalues.to_numpy(),
+                                    'ci_low': ci[0].to_numpy(),
+                                    'ci_high': ci[1].to_numpy(),
+                                    'nobs': int(model.nobs),
+                                    'rsquared': model.rsquared,
+                                    'error': None}))
+    return pd.concat(tables, ignore_index=True)
+
+
+# necessary for coefficient_table
+# returns error message of a model with collinear variables
+def rank_error(model):
+    exog = model.model.exog
+    constant = [name for name, column in zip(model.model.exog_names, exog.T)
+                if name != 'Intercept' and np.ptp(column) == 0]
+    if len(constant) > 0:
+        return 'rank deficient: constant in the group: ' + ', '.join(constant)
+    return 'rank deficient: rank {} of {} columns'.format(int(model.model.rank), exog.shape[1])
+
+
+# necessary for coefficient_table
+# fits the models of one group together, if this fails every model is fitted on its own
+# returns list of OLS-regression models or error messages of the models failing
+def fit_group(df, models):
+    from patsy import PatsyError
+
+    errors = (PatsyError, ValueError, np.linalg.LinAlgError)
+    try:
+        return regression_family(df, models)
+    except errors:
+        pass
+    results = []
+    for model in models:
+        try:
+            results.append(regression_family(df, [model])[0])
+        except errors as error:
+            results.append(type(error).__name__ + ': ' + str(error).split('\n')[0])
+    return results
+
+
+# results of a regression with bootstrapped standard errors and confidence intervals
+# behaves like the model returned by regression
+# bse, tvalues, pvalues, cov_params and summary use the covariance of the bootstrap replicates,
+# conf_int returns the percentile or BCa intervals
+# the class derives from a class of statsmodels, so it is defined at the first use (regression.BootstrapResults)
+def bootstrap_results_class():
+    if 'BootstrapResults' in globals():
+        return globals()['BootstrapResults']
+    from statsmodels.regression.linear_model import RegressionResultsWrapper
+
+    class BootstrapResults(RegressionResultsWrapper):
+        def __init__(self, model, replicates, intervals):
+            results = copy.copy(model._results)
+            results._cache = dict()
+            results.cov_type = 'bootstrap'
+            results.cov_kwds = {'description': 'Standard errors are bootstrapped with '
+                                               + str(len(replicates)) + ' replicates.'}
+            results.cov_params_default = replicates.cov().to_numpy()
+            super().__init__(results)
+            self.bootstrap_params = replicates
+            self.bootstrap_intervals = intervals
+
+        # bootstrap confidence intervals (the level is set by bootstrap)
+        def conf_int(self, alpha=None, cols=None):
+            return self.bootstrap_intervals
+
+    # found by pickle as regression.BootstrapResults
+    BootstrapResults.__qualname__ = 'BootstrapResults'
+    globals()['BootstrapResults'] = BootstrapResults
+    return BootstrapResults
+
+
+# regression.BootstrapResults is defined at the first access
+def __getattr__(name):
+    if name == 'BootstrapResults':
+        return bootstrap_results_class()
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
+
+
+# cross-products of the clusters in the worker processes of bootstrap
+worker_data = dict()
+
+
+# bootstrap of a regression
+# respondents (or clusters, e.g. countries) are drawn with replacement
+# the cross-products X'X and X'y are computed once per cluster, replicates are sums of them,
+# so a block of replicates is solved with two matrix products and a batched solve
+# input: DataFrame, dependent & independent variables, intercept, number of replicates,
+#   column of the clusters (None = respondents), interval ('percentile' or 'bca'), alpha of the intervals,
+#   replicates per block (None = automatic), number of worker processes, seed
+# returns BootstrapResults
+def bootstrap(df, dependent_var, independent_var_list, intercept=True, replicates=5000, cluster=None,
+              interval='percentile', alpha=0.05, block_size=None, workers=1, seed=None):
+    if interval not in ('percentile', 'bca'):
+        raise ValueError('unknown interval: ' + str(interval))
+    if cluster is not None:
+        # the rows of the model are matched to the clusters by position, the index may contain duplicates
+        df = df.reset_index(drop=True)
+    model = regression(df, dependent_var, independent_var_list, intercept)
+    exog = model.model.exog
+    endog = model.model.endog
+    k = exog.shape[1]
+    xx = (exog[:, :, None] * exog[:, None, :]).reshape(len(exog), k * k)
+    xy = exog * endog[:, None]
+    if cluster is not None:
+        groups = pd.factorize(df[cluster].to_numpy()[model.model.data.row_labels])[0]
+        xx = pd.DataFrame(xx).groupby(groups).sum().to_numpy()
+        xy = pd.DataFrame(xy).groupby(groups).sum().to_numpy()
+
+    if block_size is None:
+        block_size = max(1, min(replicates, 2 ** 23 // len(xy)))
+    sizes = [block_size] * (replicates // block_size)
+    if replicates % block_size > 0:
+        sizes.append(replicates % block_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers > 1:
+        with ProcessPoolExecutor(workers, initializer=init_bootstrap_worker, initargs=(xx, xy)) as executor:
+            blocks = list(executor.map(bootstrap_worker, sizes, seeds))
+    else:
+        blocks = [bootstrap_block(xx, xy, size, s) for size, s in zip(sizes, seeds)]
+    params = pd.DataFrame(np.concatenate(blocks), columns=model.params.index).dropna()
+
+    if interval == 'percentile':
+        bounds = np.tile([[alpha / 2], [1 - alpha / 2]], (1, k))
+    else:
+        bounds = bca_bounds(model.params.to_numpy(), params.to_numpy(), xx, xy, alpha)
+    intervals = pd.DataFrame({0: [np.nan] * k, 1: [np.nan] * k}, index=model.params.index)
+    for j in range(k):
+        if np.isfinite(bounds[:, j]).all():
+            intervals.iloc[j] = np.quantile(params.iloc[:, j], bounds[:, j])
+    return bootstrap_results_class()(model, params, intervals)
+
+
+# solves a block of bootstrap replicates
+# input: cross-products per cluster (clusters x k*k, clusters x k), number of replicates, seed
+# returns array (replicates x k), NaN for replicates with collinear variables
+def bootstrap_block(xx, xy, size, seed):
+    rng = np.random.default_rng(seed)
+    n_groups, k = xy.shape
+    counts = rng.multinomial(n_groups, np.full(n_groups, 1 / n_groups), size=size).astype(float)
+    gram = (counts @ xx).reshape(size, k, k)
+    rhs = counts @ xy
+    params = np.full((size, k), np.nan)
+    full_rank = np.linalg.matrix_rank(gram) == k
+    params[full_rank] = np.linalg.solve(gram[full_rank], rhs[full_rank][:, :, None])[:, :, 0]
+    return params
+
+
+# necessary for bootstrap with worker processes
+# the cross-products are passed once per worker instead of once per block
+def init_bootstrap_worker(xx, xy):
+    worker_data['xx'] = xx
+    worker_data['xy'] = xy
+
+
+# necessary for bootstrap with worker processes
+def bootstrap_worker(size, seed):
+    return bootstrap_block(worker_data['xx'], worker_data['xy'], size, seed)
+
+
+# quantiles of the BCa (bias-corrected and accelerated) intervals
+# bias from the share of replicates below the estimate, acceleration from the leave-one-cluster-out jackknife
+# returns array (2 x k) with the lower and upper quantile per coefficient
+def bca_bounds(params, replicates, xx, xy, alpha, chunk_size=10000):
+    import scipy.stats as stats
+
+    n_groups, k = xy.shape
+    bias = stats.norm.ppf((replicates < params).mean(axis=0))
+    gram = xx.sum(axis=0)
+    rhs = xy.sum(axis=0)
+    jackknife = np.empty((n_groups, k))
+    for start in range(0, n_groups, chunk_size):
+        stop = min(start + chunk_size, n_groups)
+        jackknife[start:stop] = np.linalg.solve((gram - xx[start:stop]).reshape(-1, k, k),
+                                                (rhs - xy[start:stop])[:, :, None])[:, :, 0]
+    diff = jackknife.mean(axis=0) - jackknife
+    acceleration = (diff ** 3).sum(axis=0) / (6 * ((diff ** 2).sum(axis=0)) ** 1.5)
+    z = stats.norm.ppf([[alpha / 2], [1 - alpha / 2]])
+    return stats.norm.cdf(bias + (bias + z) / (1 - acceleration * (bias + z)))
+
+
+# fields of a model in the result store (the same in every row of the model)
+STORE_FIELDS = ['formula', 'dependent', 'cov_type', 'data_hash', 'nobs', 'df_model', 'df_resid', 'rsquared',
+                'rsquared_adj', 'fvalue', 'f_pvalue', 'ssr']
+
+
+# stores the essentials of fitted models in a Parquet file (one row per model and term)
+# coefficient, standard error, p-value, confidence interval and row of the covariance matrix per term,
+# formula, dependent variable, type of covariance, hash of the data and statistics of the fit per model
+# models already stored under the same name are replaced
+# input: fitted models (e.g. of regression_family or bootstrap), file, names of the models (default 1, 2, ...),
+#   hash of the data the models are fitted on (e.g. cache.dataset_key)
+def store_results(models, filename, names=None, data_hash=None):
+    names = [str(i + 1) for i in range(len(models))] if names is None else [str(name) for name in names]
+    frames = list()
+    for name, model in zip(names, models):
+        intervals = model.conf_int()
+        frame = pd.DataFrame({'model': name,
+                              'position': np.arange(len(model.params)),
+                              'term': model.params.index.astype(str),
+                              'param': model.params.to_numpy(dtype=float),
+                              'bse': np.asarray(model.bse, dtype=float),
+                              'pvalue': np.asarray(model.pvalues, dtype=float),
+                              'ci_low': intervals[0].to_numpy(dtype=float),
+                              'ci_high': intervals[1].to_numpy(dtype=float),
+                              'cov': list(np.asarray(model.cov_params(), dtype=float))})
+        frame['formula'] = getattr(model.model, 'formula', None)
+        frame['dependent'] = model.model.endog_names
+        frame['cov_type'] = model.cov_type
+        frame['data_hash'] = data_hash
+        for field in STORE_FIELDS[4:]:
+            frame[field] = float(np.squeeze(getattr(model, field)))
+        frames.append(frame)
+    if os.path.exists(filename):
+        stored = pd.read_parquet(filename)
+        frames.insert(0, stored[~stored['model'].isin(names)])
+    directory = os.path.dirname(filename)
+    if directory != '':
+        os.makedirs(directory, exist_ok=True)
+    temporary = cache.temporary_name(filename)
+    pd.concat(frames, ignore_index=True).to_parquet(temporary, index=False)
+    os.replace(temporary, filename)
+
+
+# names of the models in the result store
+def stored_models(filename):
+    if not os.path.exists(filename):
+        return []
+    return list(dict.fromkeys(pd.read_parquet(filename, columns=['model'])['model']))
+
+
+# loads models from the result store without the data they were fitted on
+# input: file, names of the models (all if None)
+# returns list of StoredResults in the order of the names
+def load_results(filename, names=None):
+    filters = None if names is None else [('model', 'in', [str(name) for name in names])]
+    df = pd.read_parquet(filename, filters=filters)
+    columns = {column: df[column].to_numpy() for column in df.columns}
+    groups = df.groupby('model', sort=False).indices
+    names = list(groups) if names is None else [str(name) for name in names]
+    results = list()
+    for name in names:
+        rows = groups[name][np.argsort(columns['position'][groups[name]])]
+        results.append(StoredResults(name, {column: values[rows] for column, values in columns.items()}))
+    return results
+
+
+# lightweight results of a regression loaded from the result store (record = dict of the columns of its rows)
+# has the attributes and methods of the fitted models used by graphs.create_html_table, tables.render and
+# graphs.scatter_fit (predictions only for models of numeric variables)
+class StoredResults:
+    def __init__(self, name, record):
+        self.name = name
+        for field in STORE_FIELDS[2:]:
+            setattr(self, field, record[field][0])
+        self.model = StoredModel(record['formula'][0], record['dependent'][0], list(record['term']))
+        index = pd.Index(self.model.exog_names)
+        self.params = pd.Series(record['param'], index=index)
+        self.bse = pd.Series(record['bse'], index=index)
+        self.pvalues = pd.Series(record['pvalue'], index=index)
+        self.tvalues = self.params / self.bse
+        self.intervals = pd.DataFrame({0: record['ci_low'], 1: record['ci_high']}, index=index)
+        self.covariance = pd.DataFrame(np.stack(record['cov']), index=index, columns=index)
+        self.scale = self.ssr / self.df_resid
+
+    # covariance matrix of the coefficients
+    def cov_params(self):
+        return self.covariance
+
+    # confidence intervals (stored for alpha = 0.05 and for bootstrapped models, otherwise from the t-distribution)
+    def conf_int(self, alpha=0.05, cols=None):
+        if alpha == 0.05 or self.cov_type == 'bootstrap':
+            return self.intervals
+        import scipy.stats as stats
+
+        q = stats.t.ppf(1 - alpha / 2, self.df_resid)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    # predictions for new values of the variables (only intercept and numeric variables)
+    def get_prediction(self, exog):
+        missing = [term for term in self.params.index if term != 'Intercept' and term not in exog]
+        if len(missing) > 0:
+            raise ValueError('predictions of stored models need the numeric variables: ' + ', '.join(missing))
+        design = np.column_stack([np.ones(len(exog)) if term == 'Intercept' else exog[term].to_numpy(dtype=float)
+                                  for term in self.params.index])
+        se_mean = np.sqrt(np.einsum('ij,jk,ik->i', design, self.covariance.to_numpy(), design))
+        return StoredPrediction(design @ self.params.to_numpy(), se_mean, self.scale, self.df_resid)
+
+
+# necessary for StoredResults
+# model of the stored results (names of the variables and formula)
+class StoredModel:
+    def __init__(self, formula, endog_names, exog_names):
+        self.formula = formula
+        self.endog_names = endog_names
+        self.exog_names = exog_names
+
+
+# necessary for StoredResults
+# predictions of stored results with confidence and prediction intervals
+class StoredPrediction:
+    def __init__(self, mean, se_mean, scale, df_resid):
+        self.mean = mean
+        self.se_mean = se_mean
+        self.scale = scale
+        self.df_resid = df_resid
+
+    # returns DataFrame with the columns of statsmodels (mean, mean_se, mean_ci_lower, mean_ci_upper,
+    # obs_ci_lower, obs_ci_upper)
+    def summary_frame(self, alpha=0.05):
+        import scipy.stats as stats
+
+        q = stats.t.ppf(1 - alpha / 2, self.df_resid)
+        se_obs = np.sqrt(self.se_mean ** 2 + self.scale)
+        return pd.DataFrame({'mean': self.mean,
+                             'mean_se': self.se_mean,
+                             'mean_ci_lower': self.mean - q * self.se_mean,
+                             'mean_ci_upper': self.mean + q * self.se_mean,
+                             'obs_ci_lower': self.mean - q * se_obs,
+                             'obs_ci_upper': self.mean + q * se_obs})
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""\
+file creating synthetic data in the format of the EVS trend file
+contains every column read by data_handler with the codes of the EVS, including the missing codes
+used to run and stress-test the project without the licensed data file
+
+usage: python synthetic.py rows filename [filename ...] [--missing 0.02] [--correlation 0.3] [--seed 0]
+(the format is chosen by the extension: .dta = Stata, .parquet = Parquet)
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_handler as data
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# waves of the EVS in the trend file (s002vs)
+# 1 = 1981, 2 = 1990, 4 = 1999, 5 = 2008, 7 = 2017
+WAVES = [1, 2, 4, 5, 7]
+
+# numeric country codes (ISO 3166) of the countries in data_handler.COUNTRY_FILE, used for X002_02A
+BIRTH_COUNTRIES = {
+    'AL': 8, 'AM': 51, 'AT': 40, 'AZ': 31, 'BA': 70, 'BE': 56, 'BG': 100, 'BY': 112, 'CH': 756, 'CY': 196,
+    'CY-TCC': 197, 'CZ': 203, 'DE': 276, 'DK': 208, 'EE': 233, 'ES': 724, 'FI': 246, 'FR': 250, 'GB': 826,
+    'GB-GBN': 826, 'GB-NIR': 909, 'GE': 268, 'GR': 300, 'HR': 191, 'HU': 348, 'IE': 372, 'IS': 352, 'IT': 380,
+    'LT': 440, 'LU': 442, 'LV': 428, 'MD': 498, 'ME': 499, 'MK': 807, 'MT': 470, 'NL': 528, 'NO': 578,
+    'PL': 616, 'PT': 620, 'RO': 642, 'RS': 688, 'RS-KM': 412, 'RU': 643, 'SE': 752, 'SI': 705, 'SK': 703,
+    'TR': 792, 'UA': 804,
+}
+
+# answers of the attitude items (valid codes of the survey, e.g. 'other' (3) of B008 is valid)
+# the items depend on a common latent attitude, see generate
+ITEMS = {
+    'B008': [1, 2, 3],
+    'E035': list(range(1, 11)),
+    'G035': [1, 2, 3, 4],
+    'G034': [1, 2, 3, 4],
+    'C039': [1, 2, 3, 4, 5],
+    'C038': [1, 2, 3, 4, 5],
+    'C001_01': [1, 2, 3, 4, 5],
+    'E033': list(range(1, 11)),
+    'D062': [1, 2, 3, 4],
+    'D061': [1, 2, 3, 4],
+    'D060': [1, 2, 3, 4],
+    'D026_03': [1, 2, 3, 4, 5],
+    'D022': [0, 1],
+    'D038': [1, 2, 3],
+    'A005': [1, 2, 3, 4],
+    'E015': [1, 2, 3],
+    'D059': [1, 2, 3, 4],
+    'D078': [1, 2, 3, 4],
+    'E233': list(range(0, 11)),
+    'D037': [1, 2, 3],
+}
+
+# share of the missing codes among the missing values
+# -5 = other missing, -4 = not asked, -3 = not applicable, -2 = no answer, -1 = don't know
+MISSING_SHARES = {-5: 0.05, -4: 0.1, -3: 0.05, -2: 0.4, -1: 0.4}
+
+
+# creates synthetic data in the format of the EVS trend file
+# every respondent has a latent attitude (shared within a country by country_effect),
+# the attitude items are ordered by their recoded value, so the items of the scores are positively correlated
+# marital status, partner and employment are consistent (e.g. -3 = not applicable without partner)
+# input: number of rows, share of missing values per column, correlation of the latent values of two items,
+#   share of the variance of the latent attitude between countries, waves (s002vs), seed
+# returns DataFrame with the columns data_handler.SOURCE_COLUMNS
+def generate(rows=50000, missing=0.02, correlation=0.3, country_effect=0.1, waves=WAVES, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(index=pd.RangeIndex(rows))
+    df['s002vs'] = rng.choice(np.array(waves, dtype=np.int8), rows)
+
+    # countries with sample sizes between 1000 and 3600 respondents
+    countries = data.load_countries().index.to_numpy(dtype=object)
+    sizes = rng.uniform(1000, 3600, len(countries))
+    country = rng.choice(len(countries), rows, p=sizes / sizes.sum())
+    df['S009'] = countries[country]
+    own = np.array([BIRTH_COUNTRIES.get(c, 0) for c in countries], dtype=np.int16)[country]
+    others = np.array(sorted(set(BIRTH_COUNTRIES.values())), dtype=np.int16)
+    born = rng.random(rows)
+    df['X002_02A'] = np.where(born < 0.92, own, rng.choice(others, rows))
+    # born in the GDR
+    df.loc[(df['S009'].to_numpy() == 'DE') & (born < 0.15), 'X002_02A'] = 278
+
+    # latent attitude
+    attitude = (np.sqrt(country_effect) * rng.standard_normal(len(countries))[country] +
+                np.sqrt(1 - country_effect) * rng.standard_normal(rows))
+    for column, codes in ITEMS.items():
+        value = np.sqrt(correlation) * attitude + np.sqrt(1 - correlation) * rng.standard_normal(rows)
+        df[column] = ordered_codes(column, codes)[answer(value, len(codes))]
+
+    # demographics
+    df['X001'] = rng.choice(np.array([1, 2], dtype=np.int8), rows)
+    df['X003'] = rng.integers(15, 91, rows).astype(np.int16)
+    df['X011'] = np.minimum(rng.poisson(1.6, rows), 8).astype(np.int8)
+    df['X025'] = rng.choice(np.arange(1, 9, dtype=np.int8), rows, p=[.04, .12, .1, .24, .06, .16, .1, .18])
+
+    # marital status: 1 = married, 2 = living together as married, 3 = divorced, 4 = separated, 5 = widowed,
+    # 6 = single
+    married = rng.choice(np.arange(1, 7, dtype=np.int8), rows, p=[.5, .08, .08, .02, .08, .24])
+    df['X007'] = married
+    # living with partner (-3 if married), stable relationship (-3 if married or living with partner)
+    living = np.where(married == 1, -3, np.where((married == 2) | (rng.random(rows) < 0.15), 1, 2))
+    stable = np.where((married == 1) | (living == 1), -3, np.where(rng.random(rows) < 0.3, 1, 2))
+    df['X007_02'] = living.astype(np.int8)
+    df['X004'] = stable.astype(np.int8)
+    partner = (married == 1) | (living == 1) | (stable == 1)
+
+    # employment: 1 = full time, 2 = part time, 3 = self employed, 4 = retired, 5 = housewife, 6 = student,
+    # 7 = unemployed, 8 = other
+    employment = [.4, .1, .07, .2, .08, .07, .06, .02]
+    df['X028'] = rng.choice(np.arange(1, 9, dtype=np.int8), rows, p=employment)
+    df['W003'] = np.where(partner, rng.choice(np.arange(1, 11, dtype=np.int8), rows,
+                                              p=[.42, .1, .07, .01, .2, .08, .02, .06, .02, .02]), -3)
+    df['W002E'] = np.where(partner, rng.choice(np.arange(1, 9, dtype=np.int8), rows,
+                                               p=[.04, .12, .1, .24, .06, .16, .1, .18]), -3)
+    # social class (-3 = unemployed)
+    df['X036C'] = np.where(df['X028'].to_numpy() == 7, -3, rng.integers(1, 12, rows))
+
+    # missing values
+    codes = np.array(list(MISSING_SHARES), dtype=np.int8)
+    shares = np.array(list(MISSING_SHARES.values()))
+    for column in df.columns.drop(['s002vs', 'S009']):
+        values = df[column].to_numpy()
+        is_missing = rng.random(rows) < missing
+        values = np.where(is_missing, rng.choice(codes, rows, p=shares), values)
+        df[column] = values.astype(np.int16 if column in ('X002_02A', 'X003') else np.int8)
+
+    # design weights with mean 1 per country
+    weights = rng.lognormal(0, 0.4, rows)
+    df['S017'] = weights / pd.Series(weights).groupby(country).transform('mean').to_numpy()
+    return df[data.SOURCE_COLUMNS]
+
+
+# codes of an item ordered by the value they are recoded to by data_handler.RECODES
+# returns numpy array
+def ordered_codes(column, codes):
+    mapping = dict()
+    for spec in data.RECODES.values():
+        if spec['source'] == column:
+            mapping = spec.get('values', {})
+    return np.array(sorted(codes, key=lambda code: mapping.get(code, code)), dtype=np.int8)
+
+
+# necessary for generate
+# index of the answer of a standard normal latent value, all answers are equally likely
+def answer(value, n_answers):
+    import scipy.stats as stats
+
+    return np.searchsorted(stats.norm.ppf(np.arange(1, n_answers) / n_answers), value)
+
+
+# writes the data in the format given by the extension of the file (.dta or .parquet)
+def write(df, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.dta':
+        df.to_stata(filename, write_index=False, version=118)
+    elif extension == '.parquet':
+        df.to_parquet(filename, index=False)
+    else:
+        raise ValueError('unknown file format: ' + filename)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='synthetic data in the format of the EVS trend file')
+    parser.add_argument('rows', type=int, help='number of rows')
+    parser.add_argument('filenames', nargs='+', help='files to write (.dta or .parquet)')
+    parser.add_argument('--missing', type=float, default=0.02, help='share of missing values per column')
+    parser.add_argument('--correlation', type=float, default=0.3, help='correlation of the attitude items')
+    parser.add_argument('--country-effect', type=float, default=0.1,
+                        help='share of the variance of the attitude between countries')
+    parser.add_argument('--waves', type=int, nargs='+', default=WAVES, help='waves (s002vs)')
+    parser.add_argument('--seed', type=int, default=0, help='seed')
+    args = parser.parse_args()
+
+    df = generate(args.rows, args.missing, args.correlation, args.country_effect, args.waves, args.seed)
+    for filename in args.filenames:
+        write(df, filename)
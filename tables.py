@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+
+"""\
+file rendering regression tables without Stargazer
+the results of a model are extracted once into a lightweight dict, the formatted cells of a model are
+cached by a hash of its results, so tables of many specifications or countries reuse the cells of the models
+one table is rendered in several formats at once: HTML and LaTeX (in the layout of Stargazer), Markdown and CSV
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+# file extensions of the formats
+EXTENSIONS = {'html': 'html', 'latex': 'tex', 'markdown': 'md', 'csv': 'csv'}
+
+# significance levels of the stars
+SIGNIFICANCE_LEVELS = [0.1, 0.05, 0.01]
+
+# statistics in the footer of the table: (option, key, label per format)
+STATS = [('show_n', 'nobs', {'html': 'Observations', 'latex': 'Observations', 'text': 'Observations'}),
+         ('show_r2', 'r2', {'html': 'R<sup>2</sup>', 'latex': '$R^2$', 'text': 'R2'}),
+         ('show_adj_r2', 'r2_adj', {'html': 'Adjusted R<sup>2</sup>', 'latex': 'Adjusted $R^2$',
+                                    'text': 'Adjusted R2'}),
+         ('show_residual_std_error', 'resid_std_err', {'html': 'Residual Std. Error', 'latex': 'Residual Std. Error',
+                                                       'text': 'Residual Std. Error'}),
+         ('show_f_statistic', 'f_statistic', {'html': 'F Statistic', 'latex': 'F Statistic', 'text': 'F Statistic'})]
+
+# special characters of LaTeX (as Stargazer with escape=True)
+LATEX_ESCAPES = [('\\', r'\textbackslash '), ('_', r'\_'), ('%', r'\%'), ('$', r'\$'), ('#', r'\#'),
+                 ('{', r'\{'), ('}', r'\}'), ('~', r'\textasciitilde '), ('^', r'\textasciicircum '), ('&', r'\&')]
+
+# formatted cells of the models, key = (hash of the results, significant digits, confidence intervals,
+# degrees of freedom)
+fragments = dict()
+
+
+# extracts the results of a fitted model needed for a table
+# (e.g. of regression.regression, regression.regression_family or regression.bootstrap)
+# returns dict with dependent variable, names of the covariates, numpy arrays of the coefficients,
+#   standard errors, p-values and confidence limits, the statistics of the model and the hash of the results
+def extract(model):
+    names = list(model.params.index)
+    intervals = model.conf_int()
+    results = {'dependent': model.model.endog_names,
+               'names': names,
+               'params': np.asarray(model.params, dtype=float),
+               'bse': np.asarray(model.bse, dtype=float),
+               'pvalues': np.asarray(model.pvalues, dtype=float),
+               'ci_low': np.asarray(intervals[0], dtype=float),
+               'ci_high': np.asarray(intervals[1], dtype=float)}
+    for key, attribute in [('nobs', 'nobs'), ('r2', 'rsquared'), ('r2_adj', 'rsquared_adj'),
+                           ('f_statistic', 'fvalue'), ('f_pvalue', 'f_pvalue'), ('df_model', 'df_model'),
+                           ('df_resid', 'df_resid')]:
+        value = getattr(model, attribute, None)
+        results[key] = None if value is None else float(np.asarray(value).squeeze())
+    ssr = getattr(model, 'ssr', None)
+    results['resid_std_err'] = None if ssr is None else float(np.sqrt(ssr / model.df_resid))
+    results['hash'] = result_hash(results)
+    return results
+
+
+# necessary for extract
+# hash of the extracted results (sha256)
+def result_hash(results):
+    digest = hashlib.sha256(json.dumps([results['dependent'], results['names']]).encode())
+    for key in ['params', 'bse', 'pvalues', 'ci_low', 'ci_high']:
+        digest.update(results[key].tobytes())
+    stats = [results[key] for key in ['nobs', 'r2', 'r2_adj', 'resid_std_err', 'f_statistic', 'f_pvalue',
+                                      'df_model', 'df_resid']]
+    digest.update(np.array([np.nan if value is None else value for value in stats], dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+# remove the cached cells
+def clear_fragments():
+    fragments.clear()
+
+
+# renders a regression table of the models in all formats passed ('html', 'latex', 'markdown', 'csv')
+# models = fitted models or results of extract
+# the options are those of graphs.create_html_table, escape = escape special characters in LaTeX
+# (off by default as in Stargazer.render_latex, so the LaTeX equals Stargazer's for the same escape)
+# returns dict {format: table}
+def render(models,
+           formats=('html',),
+           title='',
+           custom_columns=[],
+           show_model_numbers=True,
+           significant_digits=4,
+           covariate_order=[],
+           rename_covariates={},
+           degrees_of_freedom=False,
+           custom_notes=[],
+           show_f_statistic=False,
+           show_n=False,
+           show_residual_std_error=False,
+           dep_var_list=[],
+           show_confidence_intervals=False,
+           escape=False):
+    results = [model if isinstance(model, dict) else extract(model) for model in models]
+    dependents = [result['dependent'] for result in results]
+    names = list(covariate_order) if len(covariate_order) > 0 else \
+        sorted(set(name for result in results for name in result['names']))
+    missing = set(names).difference(name for result in results for name in result['names'])
+    if len(missing) > 0:
+        raise ValueError('covariate order must contain existing covariates: {} are not'.format(missing))
+    options = {'show_n': show_n, 'show_r2': True, 'show_adj_r2': True,
+               'show_residual_std_error': show_residual_std_error, 'show_f_statistic': show_f_statistic}
+    table = {'n': len(results),
+             'title': title,
+             'dependent': dependents[0] if dependents.count(dependents[0]) == len(dependents) else None,
+             'columns': custom_columns,
+             'numbers': show_model_numbers,
+             'dep_var_list': dep_var_list,
+             'names': names,
+             'labels': [rename_covariates.get(name, name) for name in names],
+             'cells': [model_cells(result, significant_digits, show_confidence_intervals, degrees_of_freedom)
+                       for result in results],
+             'stats': [(key, labels) for option, key, labels in STATS if options[option]],
+             'notes': custom_notes,
+             'escape': escape}
+    renderers = {'html': render_html, 'latex': render_latex, 'markdown': render_markdown, 'csv': render_csv}
+    return {table_format: renderers[table_format](table) for table_format in formats}
+
+
+# writes the regression table to filename (without extension) in all formats passed
+# the options are those of render
+# returns list of the files written
+def write_table(models, filename, formats=('html',), **options):
+    files = list()
+    for table_format, text in render(models, formats, **options).items():
+        files.append(filename + '.' + EXTENSIONS[table_format])
+        with open(files[-1], 'w') as file:
+            file.write(text)
+    return files
+
+
+# necessary for render
+# formatted cells of a model, cached by the hash of the results
+# coefficients and the F statistic are (number, stars, suffix), the markup of the stars depends on the format
+# returns dict {'main': {covariate: cell}, 'precision': {covariate: text}, 'stats': {statistic: cell}}
+def model_cells(results, significant_digits=4, show_confidence_intervals=False, degrees_of_freedom=False):
+    key = (results['hash'], significant_digits, show_confidence_intervals, degrees_of_freedom)
+    if key in fragments:
+        return fragments[key]
+    number = '{:.' + str(significant_digits) + 'f}'
+    main = dict()
+    precision = dict()
+    for i, name in enumerate(results['names']):
+        main[name] = (number.format(results['params'][i]), stars(results['pvalues'][i]), '')
+        if show_confidence_intervals:
+            precision[name] = '(' + number.format(results['ci_low'][i]) + ' , ' + \
+                              number.format(results['ci_high'][i]) + ')'
+        else:
+            precision[name] = '(' + number.format(results['bse'][i]) + ')'
+    cells = {'nobs': None if results['nobs'] is None else str(int(results['nobs']))}
+    for stat in ['r2', 'r2_adj']:
+        cells[stat] = None if results[stat] is None else number.format(results[stat])
+    cells['resid_std_err'] = None
+    if results['resid_std_err'] is not None:
+        cells['resid_std_err'] = number.format(results['resid_std_err'])
+        if degrees_of_freedom:
+            cells['resid_std_err'] += ' (df={:.0f})'.format(results['df_resid'])
+    cells['f_statistic'] = None
+    if results['f_statistic'] is not None:
+        suffix = ' (df={:.0f}; {:.0f})'.format(results['df_model'], results['df_resid']) if degrees_of_freedom else ''
+        cells['f_statistic'] = (number.format(results['f_statistic']), stars(results['f_pvalue']), suffix)
+    fragments[key] = {'main': main, 'precision': precision, 'stats': cells}
+    return fragments[key]
+
+
+# necessary for model_cells
+# stars of a p-value (as Stargazer)
+def stars(p_value):
+    if p_value is None or p_value >= SIGNIFICANCE_LEVELS[0]:
+        return ''
+    if p_value >= SIGNIFICANCE_LEVELS[1]:
+        return '*'
+    if p_value >= SIGNIFICANCE_LEVELS[2]:
+        return '**'
+    return '***'
+
+
+# necessary for the renderers
+# text of a cell with the stars in the markup passed (e.g. '<sup>{}</sup>')
+def cell_text(cell, markup):
+    if cell is None:
+        return ''
+    if isinstance(cell, tuple):
+        return cell[0] + markup.format(cell[1]) + cell[2]
+    return cell
+
+
+# necessary for render
+# table in HTML (as Stargazer.render_html)
+def render_html(table):
+    n = table['n']
+    rule = '<tr><td colspan="' + str(n + 1) + '" style="border-bottom: 1px solid black"></td></tr>'
+    parts = list()
+    if table['title'] != '':
+        parts.append(table['title'] + '<br>')
+    parts.append('<table style="text-align:center">' + rule + '\n')
+    if table['dependent'] is not None:
+        parts.append('<tr><td style="text-align:left"></td><td colspan="' + str(n) + '"><em>Dependent variable: ' +
+                     table['dependent'] + '</em></td></tr>')
+    parts.append('<tr><td style="text-align:left"></td>')
+    if isinstance(table['columns'], str):
+        parts.append('<td colspan="' + str(n) + '">' + table['columns'] + '</td></tr>')
+    elif len(table['columns']) > 0:
+        parts.append('<tr><td></td>' + ''.join('<td colspan="1">{}</td>'.format(label)
+                                                 for label in table['columns']) + '</tr>')
+    if table['numbers']:
+        parts.append('<tr><td style="text-align:left"></td>' +
+                     ''.join('<td>(' + str(i) + ')</td>' for i in range(1, n + 1)) + '</tr>')
+    parts.append('\n')
+    if len(table['dep_var_list']) > 0:
+        parts.append('<tr><td style="text-align: left">Dependent variable</td>' +
+                     ''.join('<td>' + str(value) + '</td>' for value in table['dep_var_list']) + '</tr>')
+    parts.append(rule + '\n\n')
+    for name, label in zip(table['names'], table['labels']):
+        parts.append('<tr><td style="text-align:left">' + label + '</td>' +
+                     ''.join('<td>' + cell_text(cells['main'].get(name), '<sup>{}</sup>') + '</td>'
+                             for cells in table['cells']) + '</tr>\n')
+        parts.append('<tr><td style="text-align:left"></td>' +
+                     ''.join('<td>' + cells['precision'].get(name, '') + '</td>' for cells in table['cells']) +
+                     '</tr>\n')
+    parts.append('\n<td colspan="' + str(n + 1) + '" style="border-bottom: 1px solid black"></td></tr>\n')
+    for key, labels in table['stats']:
+        values = [cells['stats'][key] for cells in table['cells']]
+        if any(value is not None for value in values):
+            parts.append('<tr><td style="text-align: left">' + labels['html'] + '</td>' +
+                         ''.join('<td>' + cell_text(value, '<sup>{}</sup>') + '</td>' for value in values) + '</tr>')
+    parts.append('\n' + rule)
+    parts.append('<tr><td style="text-align: left">Note:</td><td colspan="' + str(n) + '" style="text-align: right">' +
+                 '; '.join('<sup>' + '*' * (i + 1) + '</sup>p&lt;' + str(level)
+                           for i, level in enumerate(SIGNIFICANCE_LEVELS)) + '</td></tr>')
+    for note in table['notes']:
+        parts.append('<tr><td colspan="' + str(n + 1) + '" style="text-align: right">' + note + '</td></tr>')
+    parts.append('</table>')
+    return ''.join(parts)
+
+
+# necessary for render
+# table in LaTeX (as Stargazer.render_latex)
+def render_latex(table):
+    n = table['n']
+
+    def text(value):
+        value = str(value)
+        if table['escape']:
+            for character, replacement in LATEX_ESCAPES:
+                value = value.replace(character, replacement)
+        return value
+
+    parts = ['\\begin{table}[!htbp] \\centering\n']
+    if table['title'] != '':
+        parts.append('  \\caption{' + table['title'] + '}\n')
+    parts.append('\\begin{tabular}{@{\\extracolsep{5pt}}l' + 'c' * n + '}\n\\\\[-1.8ex]\\hline\n\\hline \\\\[-1.8ex]\n')
+    if table['dependent'] is not None:
+        parts.append('& \\multicolumn{' + str(n) + '}{c}{\\textit{Dependent variable: ' + text(table['dependent']) +
+                     '}} \\\n\\cr \\cline{2-' + str(n + 1) + '}\n')
+    if isinstance(table['columns'], str):
+        parts.append('\\\\[-1.8ex] & \\multicolumn{' + str(n) + '}{c}{' + text(table['columns']) + '} \\\\')
+    elif len(table['columns']) > 0:
+        parts.append('\\\\[-1.8ex] ' + ''.join('& \\multicolumn{1}{c}{' + text(label) + '} '
+                                               for label in table['columns']) + ' \\\\\n')
+    if table['numbers']:
+        parts.append('\\\\[-1.8ex] ' + ''.join('& (' + str(i) + ') ' for i in range(1, n + 1)) + '\\\\\n')
+    if len(table['dep_var_list']) > 0:
+        parts.append(' Dependent variable ' + ''.join('& ' + str(value) + ' ' for value in table['dep_var_list']) +
+                     '\\\\\n')
+    parts.append('\\hline \\\\[-1.8ex]\n')
+    for name, label in zip(table['names'], table['labels']):
+        parts.append(' ' + text(label) + ' ')
+        for cells in table['cells']:
+            main = cells['main'].get(name)
+            parts.append('& ' + cell_text(main, '$^{{{}}}$') + ' ' if main is not None else '& ')
+        parts.append('\\\\\n')
+        for cells in table['cells']:
+            parts.append('& ' + cells['precision'][name] + ' ' if name in cells['precision'] else '& ')
+        parts.append('\\\\\n')
+    parts.append('\\hline \\\\[-1.8ex]\n')
+    for key, labels in table['stats']:
+        values = [cells['stats'][key] for cells in table['cells']]
+        if any(value is not None for value in values):
+            parts.append(' ' + labels['latex'] + ' ' +
+                         ''.join('& ' + cell_text(value, '$^{{{}}}$') + ' ' for value in values) + '\\\\\n')
+    parts.append('\\hline\n\\hline \\\\[-1.8ex]\n\\textit{Note:} & \\multicolumn{' + str(n) + '}{r}{' +
+                 '; '.join('$^{' + '*' * (i + 1) + '}$p$<$' + str(level)
+                           for i, level in enumerate(SIGNIFICANCE_LEVELS)) + '} \\\\\n')
+    for note in table['notes']:
+        parts.append('\\multicolumn{' + str(n + 1) + '}{r}\\textit{' + text(note) + '} \\\\\n')
+    parts.append('\\end{tabular}\n\\end{table}')
+    return ''.join(parts)
+
+
+# necessary for render_markdown and render_csv
+# cells of the table as text (first row = header)
+# returns list of rows
+def text_rows(table):
+    n = table['n']
+    numbers = ['(' + str(i) + ')' for i in range(1, n + 1)]
+    columns = [table['columns']] * n if isinstance(table['columns'], str) else list(table['columns'])
+    rows = [[''] + (columns if len(columns) > 0 else numbers)]
+    if len(columns) > 0 and table['numbers']:
+        rows.append([''] + numbers)
+    if len(table['dep_var_list']) > 0:
+        rows.append(['Dependent variable'] + [str(value) for value in table['dep_var_list']])
+    elif table['dependent'] is not None:
+        rows.append(['Dependent variable'] + [table['dependent']] * n)
+    for name, label in zip(table['names'], table['labels']):
+        rows.append([label] + [cell_text(cells['main'].get(name), '{}') for cells in table['cells']])
+        rows.append([''] + [cells['precision'].get(name, '') for cells in table['cells']])
+    for key, labels in table['stats']:
+        values = [cells['stats'][key] for cells in table['cells']]
+        if any(value is not None for value in values):
+            rows.append([labels['text']] + [cell_text(value, '{}') for value in values])
+    return rows
+
+
+# necessary for render
+# table in Markdown, the notes follow the table
+def render_markdown(table):
+    rows = [[value.replace('*', '\\*').replace('|', '\\|') for value in row] for row in text_rows(table)]
+    lines = list()
+    if table['title'] != '':
+        lines += ['**' + table['title'] + '**', '']
+    lines.append('| ' + ' | '.join(rows[0]) + ' |')
+    lines.append('|:--' + '|:-:' * table['n'] + '|')
+    lines += ['| ' + ' | '.join(row) + ' |' for row in rows[1:]]
+    lines += ['', 'Note: ' + '; '.join('\\' + '\\'.join('*' * (i + 1)) + 'p<' + str(level)
+                                       for i, level in enumerate(SIGNIFICANCE_LEVELS))]
+    lines += table['notes']
+    return '\n'.join(lines) + '\n'
+
+
+# necessary for render
+# cells of the table as csv (separated by ';' as the other csv-files of the project), without notes
+def render_csv(table):
+    rows = text_rows(table)
+    return pd.DataFrame(rows[1:], columns=rows[0]).to_csv(sep=';', index=False)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+"""\
+file testing the incremental preparation of the dataset on synthetic data (see synthetic.py)
+
+usage: python -m pytest test_cache.py
+"""
+
+import numpy as np
+import pandas as pd
+
+import cache
+import data_handler as data
+import regression as reg
+import synthetic
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+
+# a new release moves the rows of DE to the beginning of the file and revises them,
+# DE is prepared again, the other partitions are kept from the first release
+def test_release_reordering_rows(tmp_path):
+    df = synthetic.generate(20000, waves=[7], seed=1)
+    synthetic.write(df, str(tmp_path / 'release_1.parquet'))
+    cache.prepare_incremental(str(tmp_path / 'release_1.parquet'), str(tmp_path / 'prepared'))
+
+    de = (df['S009'] == 'DE').to_numpy()
+    revised = df[de].copy()
+    revised['X003'] = revised['X003'].where(revised['X003'] < 0, revised['X003'] + 1)
+    release = pd.concat([revised, df[~de]], ignore_index=True)
+    synthetic.write(release, str(tmp_path / 'release_2.parquet'))
+    merged = cache.prepare_incremental(str(tmp_path / 'release_2.parquet'), str(tmp_path / 'prepared'))
+
+    assert not merged.index.duplicated().any()
+    full = data.prepare(data.load_data(str(tmp_path / 'release_2.parquet')))
+    columns = list(merged.columns)
+    pd.testing.assert_frame_equal(merged.sort_values(columns).reset_index(drop=True),
+                                  full[columns].sort_values(columns).reset_index(drop=True))
+
+    result = reg.bootstrap(merged, 'sys_jus', ['fulfillment'], replicates=50, cluster='interview_conducted',
+                           seed=0)
+    assert np.isfinite(result.bse).all()
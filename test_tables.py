@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+"""\
+file testing the native table renderer against Stargazer on synthetic data (see synthetic.py)
+
+usage: python -m pytest test_tables.py
+"""
+
+import json
+import os
+
+import pytest
+
+import data_handler as data
+import graphs as graph
+import regression as reg
+import synthetic
+import tables
+
+__author__ = 'Moritz Möckel'
+__email__ = 'mmoecke2@smail.uni-koeln.de'
+__status__ = 'finished'
+__date__ = '10.07.2024'
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analysis.json')
+
+
+# fitted models and options of the tables of analysis.json
+@pytest.fixture(scope='module')
+def table_models():
+    with open(CONFIG_FILE) as file:
+        config = json.load(file)
+    df = data.prepare(synthetic.generate(20000, waves=[7], seed=2))
+    specs = config['models']
+    return [([reg.regression(df, specs[name]['dependent'], specs[name]['independent']) for name in table['models']],
+             table['options']) for table in config['tables'].values()]
+
+
+# the HTML of the native renderer equals the HTML of Stargazer
+def test_html_equals_stargazer(table_models, tmp_path):
+    for models, options in table_models:
+        stargazer = graph.create_html_table(models, str(tmp_path / 'table.html'), **options)
+        assert tables.render(models, ('html',), **options)['html'] == stargazer.render_html()
+
+
+# the LaTeX of the native renderer equals the LaTeX of Stargazer, with and without escaping
+def test_latex_equals_stargazer(table_models, tmp_path):
+    for models, options in table_models:
+        stargazer = graph.create_html_table(models, str(tmp_path / 'table.html'), **options)
+        assert tables.render(models, ('latex',), **options)['latex'] == stargazer.render_latex()
+        for escape in (False, True):
+            assert tables.render(models, ('latex',), escape=escape, **options)['latex'] == \
+                stargazer.render_latex(escape=escape)
@@ -4,35 +4,132 @@
 file containing useful functions
 """
 
+import numpy as np
+import pandas as pd
+
+import descriptives
+
 __author__ = 'Moritz Möckel'
 __email__ = 'mmoecke2@smail.uni-koeln.de'
 __status__ = 'finished'
 __date__ = '10.07.2024'
 
+
 # function to print rows with certain keywords
 # input: dataframe and dict (e.g. {column1 : keyword1, column2 : keyword2}
-def print_conditions(df, keyword_dict):
-    count = 0
-    for index, row in df.iterrows():
-        flag_dict = dict()
-        for key in keyword_dict:
-            flag_dict[key] = False
-        for key in keyword_dict:
-            if row[key] == keyword_dict[key]:
-                flag_dict[key] = True
-        flag = True
-        for f in flag_dict:
-            if not flag_dict[f]:
-                flag = False
-        if flag:
-            print(row)
-            count = count + 1
+# (conditions and optional index as in query)
+def print_conditions(df, keyword_dict, index=None):
+    rows, count = query(df, keyword_dict, index)
+    for i, row in rows.iterrows():
+        print(row)
     print('rows found: ' + str(count))
 
 
+# rows matching all conditions
+# conditions: {column: value} (equal to value), {column: (low, high)} (between low and high, bounds included,
+#   None = no bound), {column: set or list of values} (equal to one of the values)
+# columns contained in index (see build_index) are looked up in the index,
+# the other conditions are evaluated as vectorized masks (on the rows found in the index only)
+# returns tuple (DataFrame of the matching rows in their original order, number of rows)
+def query(df, conditions, index=None):
+    positions = None
+    remaining = dict()
+    for col, condition in conditions.items():
+        found = None
+        if index is not None and col in index:
+            if index[col]['rows'] != len(df):
+                raise ValueError('index of ' + str(col) + ' was built on another DataFrame')
+            found = index_positions(index[col], condition)
+        if found is None:
+            remaining[col] = condition
+        elif positions is None:
+            positions = np.unique(found)
+        else:
+            positions = np.intersect1d(positions, found)
+    rows = df if positions is None else df.iloc[positions]
+    if len(remaining) > 0:
+        mask = np.ones(len(rows), dtype=bool)
+        for col, condition in remaining.items():
+            mask &= condition_mask(rows[col], condition)
+        rows = rows[mask]
+    return rows, len(rows)
+
+
+# builds indexes of columns for repeated queries
+# per column the row positions sorted by value (categorical and string columns by category code)
+# input: DataFrame, list of columns
+# returns dict {column: index}, only valid for the DataFrame it was built on
+def build_index(df, columns):
+    index = dict()
+    for col in columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+            categorical = pd.Categorical(values)
+            keys = categorical.codes
+            categories = categorical.categories
+            # categories of string columns are sorted, so ranges can be looked up as well
+            ordered = categorical.ordered or values.dtype == object
+        else:
+            keys = values.to_numpy()
+            categories = None
+            ordered = True
+        order = np.argsort(keys, kind='stable')
+        index[col] = {'keys': keys[order], 'order': order, 'categories': categories, 'ordered': ordered,
+                      'rows': len(df)}
+    return index
+
+
+# necessary for query
+# row positions matching a condition using the index of a column
+# returns numpy array, None if the index can not be used for the condition
+def index_positions(entry, condition):
+    keys = entry['keys']
+    categories = entry['categories']
+    if isinstance(condition, tuple):
+        if not entry['ordered']:
+            return None
+        low, high = condition
+        if categories is not None:
+            low = 0 if low is None else categories.get_indexer([low])[0]
+            high = len(categories) - 1 if high is None else categories.get_indexer([high])[0]
+            if low < 0 or high < 0:
+                return None
+        else:
+            low = -np.inf if low is None else low
+            high = np.inf if high is None else high
+        return entry['order'][np.searchsorted(keys, low, 'left'):np.searchsorted(keys, high, 'right')]
+    values = list(condition) if isinstance(condition, (set, frozenset, list)) else [condition]
+    if categories is not None:
+        values = [code for code in categories.get_indexer(values) if code >= 0]
+    slices = [entry['order'][np.searchsorted(keys, value, 'left'):np.searchsorted(keys, value, 'right')]
+              for value in values]
+    return np.concatenate(slices) if len(slices) > 0 else np.array([], dtype=np.int64)
+
+
+# necessary for query
+# evaluates a condition on a column
+# returns boolean numpy array
+def condition_mask(values, condition):
+    if isinstance(condition, tuple):
+        low, high = condition
+        if isinstance(values.dtype, pd.CategoricalDtype) and not values.dtype.ordered:
+            # unordered categories are compared by their values (e.g. strings)
+            values = values.astype(values.dtype.categories.dtype)
+        mask = np.ones(len(values), dtype=bool)
+        if low is not None:
+            mask &= (values >= low).to_numpy()
+        if high is not None:
+            mask &= (values <= high).to_numpy()
+        return mask
+    if isinstance(condition, (set, frozenset, list)):
+        return values.isin(list(condition)).to_numpy()
+    return (values == condition).to_numpy()
+
+
 # saves description of certain variables to csv
-def save_description(df, cols, filename):
+# optional: grouping columns, column of the weights, decimals of the quantiles (see descriptives.describe)
+def save_description(df, cols, filename, by=None, weight=None, decimals=None):
     filename = filename + '.csv'
-    df[cols].describe(include='all').round(4).to_csv(filename, sep=';')
+    descriptives.describe(df, cols, by, weight, decimals).round(4).to_csv(filename, sep=';')
 
 